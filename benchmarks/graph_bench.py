@@ -0,0 +1,239 @@
+# graph_bench.py>
+# Runs a full report against benchmarks/mock_graph.py and reports wall time, requests, bytes and peak memory per stage.
+# Run from the repository root: python benchmarks/graph_bench.py --events 100000 --history bench.jsonl
+
+import argparse
+import configparser
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPORTLY_DIR = os.path.join(BENCH_DIR, "..", "reportly")
+sys.path.insert(0, REPORTLY_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from mock_graph import USER, WINDOW_START, WINDOW_END, add_arguments
+
+GRAPH_URL = "https://graph.microsoft.com"
+IPAPI_URL = "https://ipapi.co"
+
+
+class MockSession(requests.Session):
+    # sends the URLs graph.py builds for Graph and ipapi.co to the mock server
+
+    def __init__(self, base_url):
+        super().__init__()
+        self.base_url = base_url
+
+    def request(self, method, url, *args, **kwargs):
+        if url.startswith("/"):
+            url = f"{self.base_url}/v1.0{url}"
+        elif url.startswith(GRAPH_URL):
+            url = self.base_url + url[len(GRAPH_URL):]
+        elif url.startswith(IPAPI_URL):
+            url = f"{self.base_url}/ipapi{url[len(IPAPI_URL):]}"
+        return super().request(method, url, *args, **kwargs)
+
+
+class RssSampler(threading.Thread):
+    # /proc/self/statm is read every few milliseconds, the resident size peak of a stage is the max of its samples
+
+    def __init__(self, interval=0.005):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.page_size = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+        self.peak = 0
+        self.running = True
+
+    def rss(self):
+        try:
+            with open("/proc/self/statm") as statm:
+                return int(statm.read().split()[1]) * self.page_size
+        except OSError:
+            import resource
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    def reset(self):
+        self.peak = self.rss()
+
+    def run(self):
+        while self.running:
+            self.peak = max(self.peak, self.rss())
+            time.sleep(self.interval)
+
+
+def start_mock_server(args):
+    command = [sys.executable, os.path.join(BENCH_DIR, "mock_graph.py"), "--port", "0", "--events", str(args.events),
+               "--groups", str(args.groups), "--ips", str(args.ips), "--latency-ms", str(args.latency_ms),
+               "--throttle", str(args.throttle), "--retry-after", str(args.retry_after), "--seed", str(args.seed)]
+    if args.no_gzip:
+        command.append("--no-gzip")
+    server = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    base_url = server.stdout.readline().strip().split(" on ")[-1]
+    if not base_url.startswith("http"):
+        server.kill()
+        raise RuntimeError("The mock Graph server did not start.")
+    return server, base_url
+
+
+def server_stats(base_url):
+    return requests.get(f"{base_url}/_stats", timeout=10).json()
+
+
+def load_settings(overrides):
+    config = configparser.ConfigParser()
+    config.read(os.path.join(REPORTLY_DIR, "config.cfg"))
+    settings = config['azure']
+    # nothing is read from or written to the caches, every run downloads the whole window
+    for key, value in {"responseCache": "", "checkpointDir": "", "geoCache": "", "geoDatabase": "", "geoRate": "0"}.items():
+        settings[key] = value
+    for override in overrides:
+        key, value = override.split("=", 1)
+        settings[key.strip()] = value.strip()
+    return settings
+
+
+def run_report(args, base_url, out_file):
+    os.chdir(REPORTLY_DIR)
+    from graph import Graph
+    from main import create_report_orchestrator
+    from ratelimit import RateLimiter
+    from transport import Transport, configure_session
+
+    settings = load_settings(args.set)
+    workers = settings.getint('geoWorkers', fallback=4)
+    geo_transport = Transport(configure_session(MockSession(base_url), workers), RateLimiter(0), workers, settings.getint('geoAttempts', fallback=3))
+    graph = Graph(settings, USER, WINDOW_START, WINDOW_END, out_file, use_cache=False, client=MockSession(base_url), geo_transport=geo_transport)
+
+    sampler = RssSampler()
+    sampler.start()
+    if args.trace_memory:
+        tracemalloc.start()
+    stages = []
+    timings = {}
+
+    def stage(name, func):
+        before = server_stats(base_url)
+        sampler.reset()
+        if args.trace_memory:
+            tracemalloc.reset_peak()
+        started = time.perf_counter()
+        result = func()
+        wall = time.perf_counter() - started
+        after = server_stats(base_url)
+        entry = {"stage": name, "wall_s": wall, "requests": 0, "throttled": 0, "bytes": 0, "peak_rss_mb": sampler.peak / 2**20}
+        for endpoint, counts in after.items():
+            for key in ("requests", "throttled", "bytes"):
+                entry[key] += counts[key] - before.get(endpoint, {}).get(key, 0)
+        if args.trace_memory:
+            entry["peak_heap_mb"] = tracemalloc.get_traced_memory()[1] / 2**20
+        stages.append(entry)
+        return result
+
+    def fetch():
+        orchestrator = create_report_orchestrator(graph)
+        results = orchestrator.run()
+        timings.update(orchestrator.timings)
+        return results
+
+    stage("user", graph.get_user)
+    stage("load_checkpoint", graph.load_checkpoint)
+    results = stage("fetch", fetch)
+    stage("save_checkpoint", graph.save_checkpoint)
+    stage("render", lambda: graph.generate_report(results))
+    stage("export", lambda: graph.export_datasets(results))
+    sampler.running = False
+    if args.trace_memory:
+        tracemalloc.stop()
+    return {"stages": stages, "tasks": timings, "endpoints": server_stats(base_url), "transport": graph.transport.stats(),
+            "events": {"initiated": len(graph.audit_initiated), "target": len(graph.audit_target), "signin": len(graph.audit_signin)},
+            "report_bytes": os.path.getsize(out_file)}
+
+
+def scale_key(args):
+    return {"events": args.events, "groups": args.groups, "ips": args.ips, "latency_ms": args.latency_ms,
+            "throttle": args.throttle, "gzip": not args.no_gzip, "set": sorted(args.set)}
+
+
+def find_baseline(path, scale):
+    baseline = None
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, encoding="utf8") as history_file:
+        for line in history_file:
+            entry = json.loads(line)
+            if entry.get("scale") == scale:
+                baseline = entry
+    return baseline
+
+
+def print_result(result):
+    print(f"{'stage':<16}{'wall s':>9}{'requests':>10}{'429':>6}{'MB sent':>9}{'peak RSS MB':>13}" + (f"{'peak heap MB':>14}" if "peak_heap_mb" in result["stages"][0] else ""))
+    for entry in result["stages"]:
+        line = f"{entry['stage']:<16}{entry['wall_s']:>9.2f}{entry['requests']:>10}{entry['throttled']:>6}{entry['bytes'] / 2**20:>9.2f}{entry['peak_rss_mb']:>13.1f}"
+        if "peak_heap_mb" in entry:
+            line += f"{entry['peak_heap_mb']:>14.1f}"
+        print(line)
+    print("tasks: " + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in sorted(result["tasks"].items(), key=lambda item: -item[1])))
+    print("endpoints: " + ", ".join(f"{name} {counts['requests']}" for name, counts in sorted(result["endpoints"].items())))
+    print(f"events kept: {result['events']}, report {result['report_bytes'] / 2**20:.2f} MB")
+
+
+def compare(result, baseline, tolerance):
+    regressions = []
+    previous = {entry["stage"]: entry for entry in baseline["stages"]}
+    for entry in result["stages"]:
+        before = previous.get(entry["stage"])
+        if before is None:
+            continue
+        for key in ("wall_s", "requests", "bytes", "peak_rss_mb"):
+            # stages under 50 ms are mostly noise
+            if key == "wall_s" and before[key] < 0.05:
+                continue
+            if entry[key] > before[key] * (1 + tolerance):
+                regressions.append(f"{entry['stage']} {key}: {before[key]:.2f} -> {entry[key]:.2f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark a reportly report against a local mock Microsoft Graph.")
+    add_arguments(parser)
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE", help="override a config.cfg [azure] key, can be repeated")
+    parser.add_argument("--trace-memory", action="store_true", help="also record the Python heap peak per stage (slower)")
+    parser.add_argument("--history", help="JSON lines file that each result is appended to")
+    parser.add_argument("--compare", help="JSON lines file with earlier results, the last one with the same scale is the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed growth over the baseline before the run fails (default 0.2)")
+    args = parser.parse_args()
+
+    server, base_url = start_mock_server(args)
+    try:
+        with tempfile.TemporaryDirectory() as output_dir:
+            result = run_report(args, base_url, os.path.join(output_dir, "report.html"))
+    finally:
+        server.terminate()
+        server.wait()
+
+    scale = scale_key(args)
+    print_result(result)
+    baseline = find_baseline(args.compare, scale)
+    if args.history:
+        with open(args.history, "a", encoding="utf8") as history_file:
+            history_file.write(json.dumps(dict(result, time=time.time(), scale=scale)) + "\n")
+    if baseline is not None:
+        regressions = compare(result, baseline, args.tolerance)
+        if regressions:
+            print("regressions against the baseline:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print("no regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
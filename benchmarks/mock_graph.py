@@ -0,0 +1,346 @@
+# mock_graph.py>
+# A local stand-in for the Microsoft Graph endpoints reportly reads, plus ipapi.co, serving synthetic data.
+# Records are generated from their index on request, so a million events cost no memory until they are paged.
+# Run from the repository root: python benchmarks/mock_graph.py --events 100000 --latency-ms 20 --throttle 0.02
+
+import argparse
+import datetime
+import gzip
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+USER = "suspicious.user@contoso.com"
+WINDOW_START = "2024-01-01"
+WINDOW_END = "2024-01-31"
+
+# event kinds and their share of --events
+EVENT_SHARES = {"initiated": 0.15, "target": 0.15, "signin_success": 0.55, "signin_failed": 0.15}
+
+CATEGORIES = ["UserManagement", "GroupManagement", "RoleManagement", "ApplicationManagement", "Policy"]
+ACTIVITIES = ["Update user", "Add member to group", "Remove member from group", "Add owner to group", "Reset password",
+              "Add member to role", "Update application", "Change user license"]
+RESOURCES = ["Office 365 Exchange Online", "Microsoft Teams", "Azure Portal", "SharePoint Online", "Microsoft Graph", "Windows Azure Active Directory"]
+APPS = ["Browser", "Mobile Apps and Desktop clients", "Exchange ActiveSync", "IMAP4", "Authenticated SMTP"]
+FAILURES = [(50126, "Invalid username or password."), (50053, "Account is locked."), (50074, "Strong authentication is required."),
+            (530032, "Blocked by security defaults."), (50131, "Device is not in required device state.")]
+CITIES = [("Seattle", "Washington", "United States", 47.61, -122.33), ("London", "England", "United Kingdom", 51.51, -0.13),
+          ("Tel Aviv", "Tel Aviv", "Israel", 32.09, 34.78), ("Sao Paulo", "Sao Paulo", "Brazil", -23.55, -46.63),
+          ("Singapore", "Singapore", "Singapore", 1.29, 103.85), ("Lagos", "Lagos", "Nigeria", 6.52, 3.38)]
+OPERATING_SYSTEMS = ["Windows 10", "MacOs", "Ios", "Android", "Linux"]
+
+
+def parse_time(value):
+    return datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def format_time(moment):
+    return moment.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+class Dataset:
+
+    def __init__(self, events=10000, groups=300, ips=200, owned=50, devices=10, roles=5, seed=1):
+        self.seed = seed
+        self.start = parse_time(WINDOW_START + "T00:00:00+00:00")
+        self.end = parse_time(WINDOW_END + "T00:00:00+00:00") + datetime.timedelta(days=1)
+        self.counts = {kind: max(1, int(events * share)) for kind, share in EVENT_SHARES.items()}
+        rng = random.Random(seed)
+        self.ips = [f"{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}" for _ in range(ips)]
+        # a few addresses carry most sign-ins, the long tail is what the IP analysis looks for
+        self.ip_weights = [1.0 / (rank + 1) ** 1.2 for rank in range(ips)]
+        self.ip_cities = {ip: CITIES[rng.randrange(len(CITIES))] for ip in self.ips}
+        self.groups = [{"id": f"00000000-0000-0000-0001-{index:012d}", "displayName": f"Group {index}", "description": f"Synthetic group {index}"}
+                       for index in range(groups)]
+        self.direct_groups = self.groups[:max(1, groups // 3)]
+        with open(_roles_map_path(), encoding='utf8') as roles_file:
+            role_ids = list(json.load(roles_file))
+        self.role_ids = role_ids[:roles]
+        self.admin_groups = {group["id"]: rng.choice(role_ids) for group in rng.sample(self.groups, max(1, groups // 10))}
+        self.owned = [{"@odata.type": "#microsoft.graph.group" if index % 2 == 0 else "#microsoft.graph.application",
+                       "id": self.groups[index % groups]["id"] if index % 2 == 0 else f"00000000-0000-0000-0002-{index:012d}",
+                       "displayName": f"Owned {index}"} for index in range(owned)]
+        self.devices = [{"id": f"00000000-0000-0000-0003-{index:012d}", "deviceId": f"00000000-0000-0000-0004-{index:012d}",
+                         "displayName": f"DEVICE-{index}", "isCompliant": index % 3 != 0} for index in range(devices)]
+
+    def event_time(self, kind, index):
+        # evenly spread and sorted, so a time filter maps to a contiguous index range
+        span = (self.end - self.start).total_seconds()
+        return self.start + datetime.timedelta(seconds=span * (index + 0.5) / self.counts[kind])
+
+    def first_index(self, kind, moment):
+        # the first event at or after moment
+        count = self.counts[kind]
+        span = (self.end - self.start).total_seconds()
+        index = min(count, max(0, math.ceil((moment - self.start).total_seconds() / span * count - 0.5)))
+        while index > 0 and self.event_time(kind, index - 1) >= moment:
+            index -= 1
+        while index < count and self.event_time(kind, index) < moment:
+            index += 1
+        return index
+
+    def index_range(self, kind, start, end):
+        first = self.first_index(kind, start) if start else 0
+        last = self.first_index(kind, end) if end else self.counts[kind]
+        return first, max(first, last)
+
+    def audit(self, kind, index):
+        rng = random.Random(f"{self.seed}-{kind}-{index}")
+        activity = rng.choice(ACTIVITIES)
+        other = f"user{rng.randint(1, 5000)}@contoso.com"
+        target_user = USER if kind == "target" else other
+        initiator = other if kind == "target" else USER
+        return {
+            "id": f"Directory_{kind}_{index:09d}",
+            "category": rng.choice(CATEGORIES),
+            "correlationId": f"{rng.getrandbits(128):032x}",
+            "result": "success" if rng.random() < 0.9 else "failure",
+            "resultReason": "",
+            "activityDisplayName": activity,
+            "activityDateTime": format_time(self.event_time(kind, index)),
+            "loggedByService": "Core Directory",
+            "operationType": "Update",
+            "initiatedBy": {"user": {"id": f"{rng.getrandbits(128):032x}", "displayName": None, "userPrincipalName": initiator,
+                                     "ipAddress": rng.choice(self.ips)}, "app": None},
+            "targetResources": [{"id": f"{rng.getrandbits(128):032x}", "displayName": None, "type": "User", "userPrincipalName": target_user,
+                                 "modifiedProperties": [{"displayName": "StsRefreshTokensValidFrom", "oldValue": "[]", "newValue": "[]"}]},
+                                {"id": rng.choice(self.groups)["id"], "displayName": "Group", "type": "Group", "userPrincipalName": None,
+                                 "modifiedProperties": []}],
+            "additionalDetails": [{"key": "UserAgent", "value": "Mozilla/5.0"}],
+        }
+
+    def signin(self, kind, index):
+        rng = random.Random(f"{self.seed}-{kind}-{index}")
+        ip = rng.choices(self.ips, self.ip_weights)[0]
+        city, state, country, latitude, longitude = self.ip_cities[ip]
+        if kind == "signin_failed":
+            code, reason = rng.choice(FAILURES)
+            details = "MFA requirement satisfied by claim in the token" if code == 50074 else None
+        else:
+            code, reason, details = 0, None, None
+        return {
+            "id": f"{kind}-{index:09d}",
+            "createdDateTime": format_time(self.event_time(kind, index)),
+            "userDisplayName": "Suspicious User",
+            "userPrincipalName": USER,
+            "userId": "00000000-0000-0000-0000-000000000001",
+            "appId": f"{rng.getrandbits(128):032x}",
+            "appDisplayName": rng.choice(RESOURCES),
+            "ipAddress": ip,
+            "clientAppUsed": rng.choice(APPS),
+            "correlationId": f"{rng.getrandbits(128):032x}",
+            "conditionalAccessStatus": "notApplied",
+            "isInteractive": rng.random() < 0.6,
+            "riskDetail": "none",
+            "riskLevelAggregated": "none",
+            "riskState": "none",
+            "resourceDisplayName": rng.choice(RESOURCES),
+            "resourceId": f"{rng.getrandbits(128):032x}",
+            "status": {"errorCode": code, "failureReason": reason, "additionalDetails": details},
+            "deviceDetail": {"deviceId": "", "displayName": None, "operatingSystem": rng.choice(OPERATING_SYSTEMS),
+                             "browser": "Edge 120.0.0", "isCompliant": False, "isManaged": False, "trustType": None},
+            "location": {"city": city, "state": state, "countryOrRegion": country[:2].upper(),
+                         "geoCoordinates": {"altitude": None, "latitude": latitude + rng.uniform(-0.05, 0.05), "longitude": longitude + rng.uniform(-0.05, 0.05)}},
+            "appliedConditionalAccessPolicies": [],
+        }
+
+
+def _roles_map_path():
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "reportly", "roles_map.json")
+
+
+class MockGraphServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, dataset, latency=0.0, throttle=0.0, retry_after=1, compress=True, seed=1):
+        super().__init__(address, MockGraphHandler)
+        self.dataset = dataset
+        self.latency = latency
+        self.throttle = throttle
+        self.retry_after = retry_after
+        self.compress = compress
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {}
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, endpoint, status, size):
+        with self.lock:
+            entry = self.stats.setdefault(endpoint, {"requests": 0, "throttled": 0, "bytes": 0})
+            entry["requests"] += 1
+            entry["bytes"] += size
+            if status == 429:
+                entry["throttled"] += 1
+
+    def should_throttle(self):
+        with self.lock:
+            return self.throttle > 0 and self.random.random() < self.throttle
+
+
+class MockGraphHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.handle_request("GET", None)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self.handle_request("POST", json.loads(self.rfile.read(length) or b"{}"))
+
+    def handle_request(self, method, body):
+        url = urlsplit(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        if url.path == "/_stats":
+            return self.send_json(200, self.server.stats, "_stats")
+        if url.path == "/_reset":
+            with self.server.lock:
+                self.server.stats = {}
+            return self.send_json(200, {}, "_stats")
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        endpoint, status, payload = self.route(method, url.path, query, body)
+        if status == 200 and self.server.should_throttle():
+            endpoint, status, payload = endpoint, 429, {"error": {"code": "TooManyRequests", "message": "Too many requests"}}
+        self.send_json(status, payload, endpoint)
+
+    def send_json(self, status, payload, endpoint):
+        data = json.dumps(payload).encode()
+        headers = {"Content-Type": "application/json"}
+        encoding = self.headers.get('Accept-Encoding', '')
+        if self.server.compress and "gzip" in encoding:
+            data = gzip.compress(data, compresslevel=5)
+            headers["Content-Encoding"] = "gzip"
+        elif self.server.compress and "deflate" in encoding:
+            data = zlib.compress(data)
+            headers["Content-Encoding"] = "deflate"
+        if status == 429:
+            headers["Retry-After"] = str(self.server.retry_after)
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+        if endpoint != "_stats":
+            self.server.count(endpoint, status, len(data))
+
+    def route(self, method, path, query, body):
+        dataset = self.server.dataset
+        if path.startswith("/ipapi/"):
+            ip = path.split("/")[2]
+            city, region, country, _, _ = dataset.ip_cities.get(ip, CITIES[0])
+            return "ipapi", 200, {"ip": ip, "city": city, "region": region, "country_name": country}
+        path = re.sub(r"^/(v1\.0|beta)", "", path)
+        if method == "POST" and path == "/$batch":
+            return "$batch", 200, {"responses": [self.batch_response(request) for request in body.get("requests", [])]}
+        if path == "/me":
+            return "me", 200, {"displayName": "Benchmark Analyst", "mail": None, "userPrincipalName": "analyst@contoso.com"}
+        if path == f"/users/{USER}":
+            return "user", 200, {"id": "00000000-0000-0000-0000-000000000001", "userPrincipalName": USER, "displayName": "Suspicious User",
+                                 "onPremisesDistinguishedName": None, "onPremisesSyncEnabled": None, "onPremisesUserPrincipalName": None,
+                                 "onPremisesSecurityIdentifier": None, "createdDateTime": "2020-05-01T10:00:00Z", "userType": "Member",
+                                 "lastPasswordChangeDateTime": "2023-12-01T10:00:00Z"}
+        if path == f"/users/{USER}/memberOf/microsoft.graph.group":
+            return "memberOf", 200, self.page(dataset.direct_groups, query, path)
+        if path == f"/users/{USER}/transitiveMemberOf/microsoft.graph.group":
+            return "transitiveMemberOf", 200, self.page(dataset.groups, query, path)
+        if path == f"/users/{USER}/ownedObjects":
+            return "ownedObjects", 200, self.page(dataset.owned, query, path)
+        if path == f"/users/{USER}/ownedDevices":
+            return "ownedDevices", 200, self.page(dataset.devices, query, path)
+        if re.fullmatch(r"/groups/[^/]+/memberOf", path):
+            return "groups/memberOf", 200, {"value": self.group_roles(path.split("/")[2])}
+        if path == "/roleManagement/directory/roleAssignments":
+            return "roleManagement", 200, self.page([{"roleDefinitionId": role_id} for role_id in dataset.role_ids], query, path)
+        if path == "/roleManagement/directory/roleEligibilityScheduleInstances":
+            return "roleManagement", 200, self.page([{"roleDefinitionId": role_id} for role_id in dataset.role_ids[:1]], query, path)
+        if path == "/reports/credentialUserRegistrationDetails":
+            return "credentialUserRegistrationDetails", 200, {"value": [{"userPrincipalName": USER, "authMethods": ["mobilePhone", "microsoftAuthenticatorPush"]}]}
+        if path == "/auditLogs/directoryAudits":
+            kind = "initiated" if "initiatedBy" in query.get("$filter", "") else "target"
+            return "directoryAudits", 200, self.event_page(kind, dataset.audit, query, path)
+        if path == "/auditLogs/signIns":
+            kind = "signin_success" if "errorCode eq 0" in query.get("$filter", "") else "signin_failed"
+            return "signIns", 200, self.event_page(kind, dataset.signin, query, path)
+        return "unknown", 404, {"error": {"code": "Request_ResourceNotFound", "message": f"No mock for {path}"}}
+
+    def group_roles(self, group_id):
+        role_id = self.server.dataset.admin_groups.get(group_id)
+        if role_id is None:
+            return []
+        return [{"@odata.type": "#microsoft.graph.directoryRole", "id": role_id, "displayName": f"Role {role_id[:8]}"}]
+
+    def batch_response(self, request):
+        if self.server.should_throttle():
+            return {"id": request["id"], "status": 429, "headers": {"Retry-After": str(self.server.retry_after)}, "body": {}}
+        group_id = request["url"].split("/")[2]
+        return {"id": request["id"], "status": 200, "body": {"value": self.group_roles(group_id)}}
+
+    def next_link(self, path, query, skip):
+        query = dict(query, **{"$skiptoken": str(skip)})
+        return f"{self.server.base_url}/v1.0{path}?{urlencode(query)}"
+
+    def page(self, records, query, path):
+        skip = int(query.get("$skiptoken", 0))
+        top = int(query.get("$top", 100))
+        payload = {"value": records[skip:skip + top]}
+        if skip + top < len(records):
+            payload["@odata.nextLink"] = self.next_link(path, query, skip + top)
+        return payload
+
+    def event_page(self, kind, build, query, path):
+        dataset = self.server.dataset
+        time_filter = query.get("$filter", "")
+        start = re.search(r" ge (\S+)", time_filter)
+        end = re.search(r" lt (\S+)", time_filter)
+        first, last = dataset.index_range(kind, parse_time(start.group(1)) if start else None, parse_time(end.group(1)) if end else None)
+        skip = int(query.get("$skiptoken", first))
+        top = min(int(query.get("$top", 100)), 999)
+        payload = {"value": [build(kind, index) for index in range(skip, min(last, skip + top))]}
+        if skip + top < last:
+            payload["@odata.nextLink"] = self.next_link(path, query, skip + top)
+        return payload
+
+
+def create_server(args, port=0):
+    dataset = Dataset(args.events, args.groups, args.ips, seed=args.seed)
+    return MockGraphServer(("127.0.0.1", port), dataset, args.latency_ms / 1000, args.throttle, args.retry_after, not args.no_gzip, args.seed)
+
+
+def add_arguments(parser):
+    parser.add_argument("--events", type=int, default=10000, help="audit and sign-in events in the window (default 10000)")
+    parser.add_argument("--groups", type=int, default=300, help="groups the user is a transitive member of (default 300)")
+    parser.add_argument("--ips", type=int, default=200, help="distinct sign-in IP addresses (default 200)")
+    parser.add_argument("--latency-ms", type=float, default=0, help="delay added to every answer")
+    parser.add_argument("--throttle", type=float, default=0, help="share of requests answered with 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with a 429")
+    parser.add_argument("--no-gzip", action="store_true", help="send uncompressed bodies")
+    parser.add_argument("--seed", type=int, default=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve synthetic Microsoft Graph and ipapi.co data for benchmarks.")
+    add_arguments(parser)
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args()
+    server = create_server(args, args.port)
+    print(f"Mock Graph for {USER} ({WINDOW_START} to {WINDOW_END}) on {server.base_url}", flush=True)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# startup.py>
+# Measures how long "import main" takes with python -X importtime and checks it against a budget.
+# Run from the repository root: python benchmarks/startup.py --budget-ms 150
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+REPORTLY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "reportly")
+HEAVY_MODULES = ["pandas", "numpy", "plotly", "azure", "msgraph", "requests"]
+
+
+def measure(module):
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=REPORTLY_DIR, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        imports.append({"module": name.strip(), "self_us": int(self_us), "cumulative_us": int(cumulative_us), "depth": depth})
+    return imports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Track the import time of reportly's entry point.")
+    parser.add_argument("--module", default="main", help="module to import (default main)")
+    parser.add_argument("--budget-ms", type=float, default=150, help="fail when the import takes longer than this")
+    parser.add_argument("--runs", type=int, default=5, help="measurements, the fastest one is reported")
+    parser.add_argument("--top", type=int, default=10, help="number of slowest imports to list")
+    parser.add_argument("--history", help="JSON lines file that each result is appended to")
+    args = parser.parse_args()
+
+    runs = [measure(args.module) for _ in range(args.runs)]
+    totals = [sum(entry["cumulative_us"] for entry in imports if entry["depth"] == 0) for imports in runs]
+    best = runs[totals.index(min(totals))]
+    total_ms = min(totals) / 1000
+
+    print(f"import {args.module}: {total_ms:.1f} ms (budget {args.budget_ms:.0f} ms, best of {args.runs})")
+    for entry in sorted(best, key=lambda entry: entry["self_us"], reverse=True)[:args.top]:
+        print(f"  {entry['self_us'] / 1000:8.1f} ms  {entry['module']}")
+
+    loaded = [entry["module"] for entry in best]
+    heavy = [module for module in HEAVY_MODULES if any(name == module or name.startswith(module + ".") for name in loaded)]
+    if heavy:
+        print("heavy modules imported at startup: " + ", ".join(heavy))
+
+    if args.history:
+        with open(args.history, "a", encoding="utf8") as history_file:
+            history_file.write(json.dumps({"time": time.time(), "module": args.module, "total_ms": total_ms, "heavy": heavy}) + "\n")
+
+    if total_ms > args.budget_ms or heavy:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
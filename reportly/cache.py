@@ -0,0 +1,52 @@
+# cache.py>
+
+import threading
+from collections import OrderedDict
+
+
+class EntityCache:
+
+    def __init__(self, maxsize=0):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.loading = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_load(self, key, loader):
+        with self.lock:
+            if key in self.entries:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return self.entries[key]
+            key_lock = self.loading.setdefault(key, threading.Lock())
+        # one loader per key, concurrent callers wait for it instead of fetching again
+        with key_lock:
+            with self.lock:
+                if key in self.entries:
+                    self.hits += 1
+                    self.entries.move_to_end(key)
+                    return self.entries[key]
+                self.misses += 1
+            try:
+                value = loader()
+                with self.lock:
+                    self.entries[key] = value
+                    if self.maxsize and len(self.entries) > self.maxsize:
+                        self.entries.popitem(last=False)
+            finally:
+                with self.lock:
+                    self.loading.pop(key, None)
+        return value
+
+    def invalidate(self, key=None):
+        with self.lock:
+            if key is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(key, None)
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self.entries)}
@@ -0,0 +1,101 @@
+# charts.py>
+
+import json
+
+
+DRILLDOWN_SCRIPT = '''
+<script type="text/javascript">
+(function() {
+    var chart = document.getElementById("%(chart_id)s");
+    var data = JSON.parse(document.getElementById("%(chart_id)s-rows").textContent);
+    var output = document.getElementById("%(chart_id)s-drilldown");
+    chart.on("plotly_click", function(event) {
+        var point = event.points[0];
+        var start = point.customdata[0], end = start + data.bucket, y = point.customdata[1], color = point.customdata[2], events = point.customdata[3];
+        var rows = data.rows.filter(function(row) {
+            return row[0] >= start && row[0] < end && row[2] === y && row[3] === color;
+        });
+        output.innerHTML = "";
+        var caption = document.createElement("p");
+        caption.textContent = events + " events" + (events > rows.length ? ", showing the first " + rows.length : "");
+        output.appendChild(caption);
+        var table = document.createElement("table");
+        rows.forEach(function(row) {
+            var tr = document.createElement("tr");
+            row.slice(1).forEach(function(value) {
+                var td = document.createElement("td");
+                td.style.whiteSpace = "pre-line";
+                td.textContent = String(value).replace(/<br>/g, "\\n");
+                tr.appendChild(td);
+            });
+            table.appendChild(tr);
+        });
+        output.appendChild(table);
+    });
+})();
+</script>
+'''
+
+
+class Charts:
+
+    def __init__(self, webgl_threshold=5000, aggregate_threshold=50000, max_buckets=200, drilldown_rows=10000):
+        self.webgl_threshold = webgl_threshold
+        self.aggregate_threshold = aggregate_threshold
+        self.max_buckets = max_buckets
+        self.drilldown_rows = drilldown_rows
+
+    def hover_texts(self, source, hover):
+        formatter, fields = hover
+        return [formatter(*values) for values in zip(*(source[field] for field in fields))]
+
+    def timeline(self, source, x, y, color, title, labels, layout, chart_id, hover):
+        import plotly.express as px
+        # hover is (formatter, fields), the text is only built for the rows that end up in the report
+        if self.aggregate_threshold and len(source) > self.aggregate_threshold:
+            return self.aggregated_timeline(source, x, y, color, title, labels, layout, chart_id, hover)
+        render_mode = "webgl" if len(source) > self.webgl_threshold else "svg"
+        source = source.assign(Information=self.hover_texts(source, hover))
+        fig = px.scatter(source, x=source[x], y=source[y], color=color, title=title,
+             hover_data=[source["Information"]], labels=labels, render_mode=render_mode)
+        fig.update_layout(**layout)
+        return fig.to_html(full_html=False, include_plotlyjs=False, div_id=chart_id)
+
+    def bucket_size(self, created):
+        import pandas as pd
+        span = created.max() - created.min()
+        steps = ["1min", "5min", "15min", "1h", "3h", "6h", "12h", "1D", "7D"]
+        for step in steps:
+            if span / pd.Timedelta(step) <= self.max_buckets:
+                return pd.Timedelta(step)
+        return pd.Timedelta(steps[-1])
+
+    def aggregated_timeline(self, source, x, y, color, title, labels, layout, chart_id, hover):
+        import numpy as np
+        import plotly.express as px
+        import pandas as pd
+        created = pd.to_datetime(source[x], utc=True, format="ISO8601")
+        bucket = self.bucket_size(created)
+        # pandas may keep the times in ns or us, so they are converted to ms explicitly
+        epoch_ms = created.dt.tz_localize(None).to_numpy().astype("datetime64[ms]").astype(np.int64)
+        bucket_ms = int(bucket / pd.Timedelta("1ms"))
+        frame = pd.DataFrame({"bucket": created.dt.floor(bucket).to_numpy(), "bucket_ms": epoch_ms // bucket_ms * bucket_ms, y: source[y].to_numpy(), color: source[color].to_numpy()})
+        counts = frame.groupby(["bucket", "bucket_ms", y, color], observed=True).size().reset_index(name="events")
+        fig = px.scatter(counts, x="bucket", y=y, color=color, size="events", size_max=30,
+             title=f"{title} ({len(source)} events per {bucket}, click a point for its events)",
+             custom_data=["bucket_ms", y, color, "events"], labels=dict(labels, bucket=labels.get(x, x)), render_mode="webgl")
+        fig.update_layout(**layout)
+        # the drill-down embeds at most drilldown_rows events, the same number for every point, the caption gives the full count
+        limit = max(1, self.drilldown_rows // max(1, len(counts)))
+        order = np.argsort(epoch_ms, kind="stable")
+        ordered = frame.iloc[order]
+        kept = order[(ordered.groupby(["bucket_ms", y, color], observed=True, dropna=False).cumcount() < limit).to_numpy()]
+        shown = source.iloc[kept]
+        rows = pd.DataFrame({"t": epoch_ms[kept], x: shown[x].to_numpy(), y: shown[y].to_numpy(), color: shown[color].to_numpy(),
+                             "Information": self.hover_texts(shown, hover)})
+        data = {"bucket": bucket_ms, "rows": rows.values.tolist()}
+        rows_json = json.dumps(data, separators=(",", ":"), default=str).replace("</", "<\\/")
+        return (fig.to_html(full_html=False, include_plotlyjs=False, div_id=chart_id)
+            + f'<script type="application/json" id="{chart_id}-rows">{rows_json}</script>'
+            + f'<div id="{chart_id}-drilldown"></div>'
+            + DRILLDOWN_SCRIPT % {"chart_id": chart_id})
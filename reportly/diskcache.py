@@ -0,0 +1,58 @@
+# diskcache.py>
+
+import json
+import sqlite3
+import threading
+import time
+
+
+class DiskCache:
+
+    def __init__(self, path, table, ttl=0, max_entries=0):
+        self.path = path
+        self.table = table
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute(f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value TEXT, stored_at REAL)")
+            self.connection.execute(f"CREATE INDEX IF NOT EXISTS {table}_stored_at ON {table} (stored_at)")
+        # rows older than the ttl are never served again, they are dropped when the cache is opened
+        self.purge_expired()
+
+    def get_entry(self, key):
+        with self.lock:
+            row = self.connection.execute(f"SELECT value, stored_at FROM {self.table} WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None, None
+        return json.loads(row[0]), row[1]
+
+    def get(self, key, max_age=None):
+        max_age = self.ttl if max_age is None else max_age
+        value, stored_at = self.get_entry(key)
+        if stored_at is None:
+            return None
+        if max_age and time.time() - stored_at > max_age:
+            return None
+        return value
+
+    def set(self, key, value):
+        with self.lock, self.connection:
+            self.connection.execute(f"INSERT OR REPLACE INTO {self.table} (key, value, stored_at) VALUES (?, ?, ?)", (key, json.dumps(value), time.time()))
+            if self.max_entries:
+                self.connection.execute(f"DELETE FROM {self.table} WHERE key IN (SELECT key FROM {self.table} ORDER BY stored_at DESC LIMIT -1 OFFSET ?)", (self.max_entries,))
+
+    def delete(self, key):
+        with self.lock, self.connection:
+            self.connection.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def purge_expired(self):
+        if not self.ttl:
+            return
+        with self.lock, self.connection:
+            self.connection.execute(f"DELETE FROM {self.table} WHERE stored_at < ?", (time.time() - self.ttl,))
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,103 @@
+# events.py>
+
+import threading
+
+
+AUDIT_FIELDS = ["id", "category", "activity", "created", "result", "targets", "initiated_by"]
+# sign-in failures that point at password spraying, locked or blocked accounts and risky sign-ins
+BAD_SIGNIN_CODES = [50088, 50131, 500021, 500022, 50053, 50135, 53011, 530034, 53010, 530032]
+SIGNIN_FIELDS = ["id", "type", "created", "resource", "interactive", "ip", "app_used", "code", "reason", "details", "latitude", "longitude"]
+
+
+class EventStore:
+
+    def __init__(self, fields):
+        self.fields = list(fields)
+        self.columns = {field: [] for field in self.fields}
+        self.lock = threading.Lock()
+
+    def extend(self, columns):
+        with self.lock:
+            for field, column in self.columns.items():
+                column.extend(columns[field])
+
+    def __len__(self):
+        return len(self.columns[self.fields[0]])
+
+    def column(self, field):
+        return self.columns[field]
+
+    def rows(self, *fields):
+        return zip(*(self.columns[field] for field in fields or self.fields))
+
+    def to_dict(self):
+        return self.columns
+
+    @classmethod
+    def from_dict(cls, fields, columns):
+        store = cls(fields)
+        for field in store.fields:
+            store.columns[field] = list(columns[field])
+        return store
+
+    def to_frame(self, fields):
+        import pandas as pd
+        # the column lists are handed to pandas directly
+        return pd.DataFrame({field: self.columns[field] for field in fields})
+
+
+def compact_targets(targets):
+    compact = []
+    for target in targets:
+        target_upn = target['userPrincipalName'] if target['type'] == "User" else None
+        compact.append((target['type'], target['id'], target['displayName'], target_upn))
+    return tuple(compact)
+
+
+def compact_initiated_by(initiated_by):
+    initiate_user = initiated_by['user']
+    initiate_app = initiated_by['app']
+    user_name = initiate_user['userPrincipalName'] if initiate_user else None
+    app = (initiate_app['displayName'], initiate_app['servicePrincipalId']) if initiate_app else None
+    return (bool(initiate_user), user_name, app)
+
+
+def format_targets(targets):
+    if targets is None:
+        return "Not relevant"
+    targets_output = "<br>Targets:<br>"
+    for target_type, target_id, target_displayName, target_upn in targets:
+        tagret_string = f"Type: {target_type}, Id: {target_id}, DisplayName: {target_displayName} "
+        if target_type == "User":
+            tagret_string += f", UPN: {target_upn} "
+        targets_output += tagret_string
+        targets_output += """;<br>"""
+    return targets_output
+
+
+def format_initiated_by(initiated_by):
+    string_initiate = ""
+    if initiated_by is None:
+        return string_initiate
+    has_user, user_name, app = initiated_by
+    if has_user:
+        string_initiate += f"User: userPrincipalName: {user_name} ; "
+    if app:
+        app_name, service_id = app
+        string_initiate += f"App: displayName: {app_name}, servicePrincipalId: {service_id} ;"
+    return string_initiate
+
+
+def format_initiated_information(targets):
+    return format_targets(targets)
+
+
+def format_target_information(targets, initiated_by):
+    return format_targets(targets) + "InitiatedBy:<br>" + format_initiated_by(initiated_by)
+
+
+def format_signin_information(type, interactive, ip, app_used, code, reason, details):
+    hover_string = f"<br>Interactive: {interactive}<br>ip: {ip}<br>app used: {app_used}"
+    if type == "failed":
+        hover_string+= f"<br>code: {code} ; reason: {reason} ; details: {details}"
+    return hover_string
@@ -0,0 +1,195 @@
+# export.py>
+
+import json
+import os
+from events import EventStore, AUDIT_FIELDS, SIGNIN_FIELDS
+
+
+EXPORT_FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+CHART_MESSAGES = {"initiated": "This user has not performed any action.", "target": "No operations have been performed on this user.",
+                  "signin": "This user has not logged in."}
+
+
+def require_pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError("Exporting datasets requires the pyarrow package (pip install pyarrow).")
+    return pyarrow
+
+
+def export_targets(targets):
+    if targets is None:
+        return None
+    return [{"type": target_type, "id": target_id, "displayName": display_name, "userPrincipalName": upn}
+            for target_type, target_id, display_name, upn in targets]
+
+
+def import_targets(targets):
+    if targets is None:
+        return None
+    return tuple((target["type"], target["id"], target["displayName"], target["userPrincipalName"]) for target in targets)
+
+
+def export_initiated_by(initiated_by):
+    if initiated_by is None:
+        return None
+    has_user, user_name, app = initiated_by
+    app_name, service_id = app if app else (None, None)
+    return {"hasUser": has_user, "userPrincipalName": user_name, "hasApp": bool(app), "appDisplayName": app_name, "servicePrincipalId": service_id}
+
+
+def import_initiated_by(initiated_by):
+    if initiated_by is None:
+        return None
+    app = (initiated_by["appDisplayName"], initiated_by["servicePrincipalId"]) if initiated_by["hasApp"] else None
+    return (initiated_by["hasUser"], initiated_by["userPrincipalName"], app)
+
+
+def audit_columns(store):
+    columns = dict(store.to_dict())
+    # the compact tuples become structs so Arrow keeps their field names
+    columns["targets"] = [export_targets(targets) for targets in columns["targets"]]
+    columns["initiated_by"] = [export_initiated_by(initiated_by) for initiated_by in columns["initiated_by"]]
+    return columns
+
+
+def audit_store(table):
+    columns = {name: table.column(name).to_pylist() for name in AUDIT_FIELDS}
+    columns["targets"] = [import_targets(targets) for targets in columns["targets"]]
+    columns["initiated_by"] = [import_initiated_by(initiated_by) for initiated_by in columns["initiated_by"]]
+    return EventStore.from_dict(AUDIT_FIELDS, columns)
+
+
+def records_columns(records, columns=None):
+    if columns is None:
+        columns = list(dict.fromkeys(key for record in records for key in record))
+    return {column: [record.get(column) for record in records] for column in columns}
+
+
+def ips_columns(ips, reported):
+    rows = []
+    ranks = {ip: rank for rank, ip in enumerate(reported, 1)}
+    for ip, ip_object in ips.items():
+        row = {"ip": ip, "count": ip_object["count"], "app_used": sorted(ip_object["app_used"], key=str), "resource": sorted(ip_object["resource"], key=str)}
+        info = reported.get(ip)
+        row["rank"] = ranks.get(ip)
+        for key in ("score", "reasons", "City", "region", "country"):
+            row[key] = info.get(key) if info else None
+        rows.append(row)
+    return records_columns(rows, ["ip", "count", "app_used", "resource", "rank", "score", "reasons", "City", "region", "country"])
+
+
+def groups_columns(groups_transitive, groups_non_transitive):
+    columns = {"Source": [], "GroupName": [], "Description": [], "Id": [], "GroupRoles": [], "Transitive": []}
+    for source, groups in (("transitive", groups_transitive), ("direct", groups_non_transitive)):
+        if not groups:
+            continue
+        for name in list(columns)[1:]:
+            columns[name].extend(groups[name])
+        columns["Source"].extend([source] * len(groups["Id"]))
+    return columns
+
+
+def write_table(columns, path, export_format):
+    pa = require_pyarrow()
+    table = pa.table(columns)
+    if export_format == "parquet":
+        import pyarrow.parquet as pq
+        pq.write_table(table, path)
+    else:
+        with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+def read_table(path):
+    # both formats are memory mapped, Arrow IPC files are even read without copying
+    pa = require_pyarrow()
+    if path.endswith(EXPORT_FORMATS["parquet"]):
+        import pyarrow.parquet as pq
+        return pq.read_table(path, memory_map=True)
+    return pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+
+
+def export_report(graph, results, directory, export_format):
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {export_format}, use one of {', '.join(EXPORT_FORMATS)}.")
+    os.makedirs(directory, exist_ok=True)
+    datasets = {
+        "audit_initiated": audit_columns(graph.audit_initiated),
+        "audit_target": audit_columns(graph.audit_target),
+        "signins": graph.audit_signin.to_dict(),
+        "bad_signins": records_columns(results["signin_errors"], ["created", "resource", "ip", "app_used", "code", "reason", "details"]),
+        "ips": ips_columns(graph.ips, results["ips"]),
+        "groups": groups_columns(results["groups_transitive"], results["groups_non_transitive"]),
+    }
+    messages = {}
+    for name in ("owned_objects", "owned_devices"):
+        if isinstance(results[name], list):
+            datasets[name] = records_columns(results[name])
+        else:
+            messages[name] = results[name]
+    files = {}
+    for name, columns in datasets.items():
+        files[name] = name + EXPORT_FORMATS[export_format]
+        write_table(columns, os.path.join(directory, files[name]), export_format)
+    meta = {
+        "user": graph.sus_user,
+        "window": [graph.window_start.isoformat(), graph.window_end.isoformat()],
+        "format": export_format,
+        "files": files,
+        "messages": messages,
+        "sus": results["user"],
+        "roles": results["roles"],
+        "eligible_roles": results["eligible_roles"],
+        "mfa": results["mfa"],
+    }
+    with open(os.path.join(directory, "export.json"), 'w', encoding='utf8') as meta_file:
+        json.dump(meta, meta_file, indent=1)
+    return directory
+
+
+def load_export(directory):
+    with open(os.path.join(directory, "export.json"), encoding='utf8') as meta_file:
+        meta = json.load(meta_file)
+    tables = {name: read_table(os.path.join(directory, file_name)) for name, file_name in meta["files"].items()}
+    return meta, tables
+
+
+def table_records(table):
+    return table.to_pylist()
+
+
+def restore_report(graph, directory):
+    meta, tables = load_export(directory)
+    graph.audit_initiated = audit_store(tables["audit_initiated"])
+    graph.audit_target = audit_store(tables["audit_target"])
+    graph.audit_signin = EventStore.from_dict(SIGNIN_FIELDS, {name: tables["signins"].column(name).to_pylist() for name in SIGNIN_FIELDS})
+    graph.ips = {}
+    reported = {}
+    for row in table_records(tables["ips"]):
+        graph.ips[row["ip"]] = {"count": row["count"], "app_used": set(row["app_used"]), "resource": set(row["resource"])}
+        if row["rank"] is not None:
+            reported[row["rank"], row["ip"]] = dict(graph.ips[row["ip"]], score=row["score"], reasons=row["reasons"], City=row["City"], region=row["region"], country=row["country"])
+    groups = {"transitive": {}, "direct": {}}
+    for row in table_records(tables["groups"]):
+        source = groups[row.pop("Source")]
+        for name, value in row.items():
+            source.setdefault(name, []).append(value)
+    results = {
+        "user": meta["sus"],
+        "roles": meta["roles"],
+        "eligible_roles": meta["eligible_roles"],
+        "mfa": meta["mfa"],
+        "groups_transitive": groups["transitive"],
+        "groups_non_transitive": groups["direct"],
+        "ips": {ip: info for (_, ip), info in sorted(reported.items())},
+        "signin_errors": table_records(tables["bad_signins"]),
+    }
+    for name in ("owned_objects", "owned_devices"):
+        results[name] = table_records(tables[name]) if name in tables else meta["messages"][name]
+    # the charts are rendered again from the restored events
+    results["initiated"] = graph.create_graph_initiated() if len(graph.audit_initiated) else CHART_MESSAGES["initiated"]
+    results["target"] = graph.create_graph_target() if len(graph.audit_target) else CHART_MESSAGES["target"]
+    results["signin"] = graph.create_graph_signin() if len(graph.audit_signin) else CHART_MESSAGES["signin"]
+    return results
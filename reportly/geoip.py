@@ -0,0 +1,102 @@
+# geoip.py>
+
+import bisect
+import csv
+import ipaddress
+from array import array
+
+
+class GeoIndex:
+
+    def __init__(self):
+        self.v4_starts = array('L')
+        self.v4_ends = array('L')
+        self.v4_locations = array('L')
+        self.v6_starts = []
+        self.v6_ends = []
+        self.v6_locations = array('L')
+        self.locations = []
+        self.location_ids = {}
+
+    @classmethod
+    def load(cls, path):
+        index = cls()
+        if path.lower().endswith('.mmdb'):
+            ranges = index.read_mmdb(path)
+        else:
+            ranges = index.read_csv(path)
+        index.build(ranges)
+        return index
+
+    def location_id(self, city, region, country):
+        key = (city or None, region or None, country or None)
+        if key not in self.location_ids:
+            self.location_ids[key] = len(self.locations)
+            self.locations.append(key)
+        return self.location_ids[key]
+
+    def read_csv(self, path):
+        # rows are either "network,city,region,country" or "start_ip,end_ip,city,region,country"
+        with open(path, newline='', encoding='utf8') as csv_file:
+            for row in csv.DictReader(csv_file):
+                if row.get('network'):
+                    network = ipaddress.ip_network(row['network'].strip(), strict=False)
+                    start, end = network[0], network[-1]
+                else:
+                    start = ipaddress.ip_address(row['start_ip'].strip())
+                    end = ipaddress.ip_address(row['end_ip'].strip())
+                location = self.location_id(row.get('city'), row.get('region'), row.get('country'))
+                yield start.version, int(start), int(end), location
+
+    def read_mmdb(self, path):
+        try:
+            import maxminddb
+        except ImportError:
+            raise ImportError("Reading .mmdb databases requires the maxminddb package (pip install maxminddb).")
+        with maxminddb.open_database(path) as reader:
+            for network, record in reader:
+                record = record or {}
+                city = record.get('city', {}).get('names', {}).get('en')
+                subdivisions = record.get('subdivisions') or [{}]
+                region = subdivisions[0].get('names', {}).get('en')
+                country = record.get('country', {}).get('names', {}).get('en')
+                location = self.location_id(city, region, country)
+                yield network.version, int(network[0]), int(network[-1]), location
+
+    def build(self, ranges):
+        v4 = []
+        v6 = []
+        for version, start, end, location in ranges:
+            if version == 4:
+                v4.append((start, end, location))
+            else:
+                v6.append((start, end, location))
+        v4.sort()
+        v6.sort()
+        for start, end, location in v4:
+            self.v4_starts.append(start)
+            self.v4_ends.append(end)
+            self.v4_locations.append(location)
+        for start, end, location in v6:
+            self.v6_starts.append(start)
+            self.v6_ends.append(end)
+            self.v6_locations.append(location)
+
+    def lookup(self, ip):
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return None
+        if address.version == 4:
+            starts, ends, locations = self.v4_starts, self.v4_ends, self.v4_locations
+        else:
+            starts, ends, locations = self.v6_starts, self.v6_ends, self.v6_locations
+        value = int(address)
+        position = bisect.bisect_right(starts, value) - 1
+        if position < 0 or value > ends[position]:
+            return None
+        city, region, country = self.locations[locations[position]]
+        return {"city": city, "region": region, "country": country}
+
+    def __len__(self):
+        return len(self.v4_starts) + len(self.v6_starts)
@@ -1,16 +1,76 @@
 # graph.py>
 
+from __future__ import annotations
+import base64
 import datetime
 import json
 from configparser import SectionProxy
-from azure.identity import DeviceCodeCredential, ClientSecretCredential
-from msgraph.core import GraphClient
-import plotly.express as px
-import pandas as pd
-import plotly.graph_objects as go
+from typing import TYPE_CHECKING
 from gui import Gui
+from charts import Charts
+from events import EventStore, AUDIT_FIELDS, SIGNIN_FIELDS, BAD_SIGNIN_CODES, compact_targets, compact_initiated_by, format_initiated_information, format_target_information, format_signin_information
 from ips import IPS
-import requests
+from cache import EntityCache
+from geoip import GeoIndex
+from diskcache import DiskCache
+from ratelimit import RateLimiter
+from transport import Transport, configure_session
+from tracing import Tracer
+from resume import ResumeLog
+from shards import ShardedFetch
+import tracing
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+import os
+import re
+
+# azure-identity, msgraph-core, pandas and requests are imported where they are first used to keep startup fast
+if TYPE_CHECKING:
+    from azure.identity import DeviceCodeCredential, ClientSecretCredential
+    from msgraph.core import GraphClient
+
+CHECKPOINT_VERSION = 3
+EVENT_QUERIES = ("initiated", "target", "success", "failed")
+
+def create_user_client(config: SectionProxy):
+    from azure.identity import DeviceCodeCredential
+    from msgraph.core import GraphClient
+    client_id = config['clientId']
+    tenant_id = config['tenantId']
+    graph_scopes = config['graphUserScopes'].split(' ')
+    device_code_credential = DeviceCodeCredential(client_id, tenant_id = tenant_id)
+    # Transport retries throttled requests itself, the client's retry middleware would sleep while holding a concurrency slot
+    user_client = GraphClient(credential=device_code_credential, scopes=graph_scopes, max_retries=0)
+    return device_code_credential, user_client
+
+def create_request_limiter(config: SectionProxy):
+    return RateLimiter(config.getfloat('graphRate', fallback=0), config.getint('graphBurst', fallback=1))
+
+def create_graph_transport(config: SectionProxy, client):
+    concurrency = config.getint('graphConcurrency', fallback=8)
+    configure_session(getattr(client, 'graph_session', client), concurrency)
+    return Transport(client, create_request_limiter(config), concurrency, config.getint('graphAttempts', fallback=5),
+                     config.getfloat('graphBackoff', fallback=1), config.getfloat('graphMaxBackoff', fallback=60))
+
+def token_tenant(token):
+    payload = token.split('.')[1]
+    claims = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+    return claims.get('tid', '')
+
+def graph_error(request_url, status, body, response=None):
+    import requests
+    error = body.get('error') if isinstance(body, dict) else None
+    message = f"Graph answered {status} for {request_url}"
+    if error and error.get('message'):
+        message += f": {error['message']}"
+    return requests.HTTPError(message, response=response)
+
+def create_geo_transport(config: SectionProxy):
+    import requests
+    workers = config.getint('geoWorkers', fallback=4)
+    limiter = RateLimiter(config.getfloat('geoRate', fallback=1), config.getint('geoBurst', fallback=1))
+    return Transport(configure_session(requests.Session(), workers), limiter, workers, config.getint('geoAttempts', fallback=3))
 
 class Graph:
     settings: SectionProxy
@@ -19,37 +79,389 @@ class Graph:
     client_credential: ClientSecretCredential
     app_client: GraphClient
 
-    def __init__(self, config: SectionProxy, sus_user, start_date, end_date, out_file="report.html"):
+    def __init__(self, config: SectionProxy, sus_user, start_date, end_date, out_file="report.html", use_cache=True, credential=None, client=None, transport=None, geo_transport=None, offline=False, shared_cache=None):
         self.settings = config
-        client_id = self.settings['clientId']
         tenant_id = self.settings['tenantId']
-        graph_scopes = self.settings['graphUserScopes'].split(' ')
+        self.tenant_id = tenant_id
+        self.token_tenant_id = None
+        self.use_cache = use_cache
         self.out_file = out_file
         self.sus_user = sus_user
         self.start_date = start_date
         self.end_date = end_date
-        self.audit_initiated = []
-        self.audit_target = []
-        self.audit_signin = []
-        self.bad_signin = []
+        self.window_start = self.parse_window_bound(start_date)
+        self.window_end = self.parse_window_bound(end_date, end=True)
+        self.fetch_start = self.window_start
+        self.checkpoint_seen = set()
+        self.completed_queries = set()
+        self.checkpoint_dir = self.settings.get('checkpointDir', fallback='')
+        self.checkpoint_lag = self.settings.getint('checkpointLag', fallback=900)
+        self.resume_fetches = self.settings.getboolean('resumeFetches', fallback=True)
+        self.resume_log = None
+        self.resumed_pages = 0
+        self.pending_rows = {}
+        self.audit_initiated = EventStore(AUDIT_FIELDS)
+        self.audit_target = EventStore(AUDIT_FIELDS)
+        self.audit_signin = EventStore(SIGNIN_FIELDS)
         self.owned_objects = []
         self.owned_devices = []
         self.ips = {}
         self.roles_list = {}
+        self.group_roles = {}
+        self.batch_size = 20
+        self.batch_attempts = self.settings.getint('batchAttempts', fallback=3)
+        self.cache = EntityCache(self.settings.getint('cacheSize', fallback=0))
+        # the geolocation database and the SQLite caches, a batch run hands every report the same one
+        self.shared_cache = shared_cache or EntityCache()
+        self.geo_database = self.settings.get('geoDatabase', fallback='')
+        self.geo_offline = self.settings.getboolean('geoOffline', fallback=False)
+        self.geo_cache_path = self.settings.get('geoCache', fallback='')
+        self.geo_workers = self.settings.getint('geoWorkers', fallback=4)
+        self.geo_attempts = self.settings.getint('geoAttempts', fallback=3)
+        self.response_cache_path = self.settings.get('responseCache', fallback='')
+        self.response_cache_max_age = self.settings.getint('responseCacheMaxAge', fallback=3600)
         self.accept_activity = ["Remove owner from group", "Remove member from group", "Add owner to group", "Add member to role", "Add member to group"]
         self.not_accept_category = ["GroupManagement"]
-        self.device_code_credential = DeviceCodeCredential(client_id,tenant_id = tenant_id)
-        self.device_code_credential = DeviceCodeCredential(client_id, tenant_id = tenant_id)
-        self.user_client = GraphClient(credential=self.device_code_credential, scopes=graph_scopes)
+        self.max_concurrency = self.settings.getint('maxConcurrency', fallback=4)
+        self.page_size = self.settings.getint('pageSize', fallback=999)
+        self.record_limit = self.settings.getint('recordLimit', fallback=0) or None
+        self.shard_pages = self.settings.getint('shardPages', fallback=4)
+        self.shard_workers = self.settings.getint('shardWorkers', fallback=4)
+        self.shard_read_ahead = self.settings.getint('shardReadAhead', fallback=8)
+        self.charts = Charts(self.settings.getint('chartWebglThreshold', fallback=5000), self.settings.getint('chartAggregateThreshold', fallback=50000),
+                             drilldown_rows=self.settings.getint('chartDrilldownRows', fallback=10000))
+        self.lock = threading.Lock()
+        self.tracer = Tracer()
+        self.ip_top = self.settings.getint('ipTopN', fallback=20)
+        self.ip_min_score = self.settings.getfloat('ipMinScore', fallback=0)
+        self.write_trace_file = self.settings.getboolean('writeTrace', fallback=True)
+        self.report_diagnostics = self.settings.getboolean('reportDiagnostics', fallback=False)
+        self.export_format = self.settings.get('exportFormat', fallback='').strip().lower()
+        self.export_directory = self.settings.get('exportDir', fallback='').strip()
+        if offline:
+            # a report rendered again from exported datasets never talks to Graph
+            self.device_code_credential = self.user_client = self.transport = self.geo_transport = None
+            return
+        if client is None:
+            credential, client = create_user_client(self.settings)
+        self.device_code_credential = credential
+        self.user_client = client
+        self.transport = transport or create_graph_transport(self.settings, client)
+        self.geo_transport = geo_transport
+
+    def parse_window_bound(self, value, end=False):
+        value = value.strip()
+        bound = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+        if bound.tzinfo is None:
+            bound = bound.replace(tzinfo=datetime.timezone.utc)
+        bound = bound.astimezone(datetime.timezone.utc)
+        # a bare end date covers that whole day, so the bound moves to the next midnight
+        if end and len(value) == 10:
+            bound += datetime.timedelta(days=1)
+        return bound
+
+    def date_filter(self, field, start=None, end=None):
+        start = (start or self.fetch_start).strftime('%Y-%m-%dT%H:%M:%SZ')
+        end = (end or self.window_end).strftime('%Y-%m-%dT%H:%M:%SZ')
+        return f"{field} ge {start} and {field} lt {end}"
+
+    def parse_event_time(self, created):
+        created_temp = created.split(".")[0].split("Z")[0]
+        created_time = datetime.datetime.strptime(created_temp, '%Y-%m-%dT%H:%M:%S')
+        return created_time.replace(tzinfo=datetime.timezone.utc)
+
+    def get_response(self, request_url, headers=None):
+        return self.transport.get(request_url, headers=headers)
+
+    def check_response(self, request_url, user_response):
+        # an error body read as data looks like an empty result, a page chain would end early and the report would
+        # show the user without events, groups or roles
+        if 200 <= user_response.status_code < 300:
+            return user_response
+        try:
+            body = user_response.json()
+        except ValueError:
+            body = None
+        raise graph_error(request_url, user_response.status_code, body, user_response)
+
+    def get_json(self, request_url):
+        user_response = self.check_response(request_url, self.get_response(request_url))
+        return user_response.json()
+
+    def get_cached(self, key, loader):
+        loaded = []
+
+        def load():
+            loaded.append(True)
+            return loader()
+        value = self.cache.get_or_load(key, load)
+        tracing.count("cache_misses" if loaded else "cache_hits")
+        return value
+
+    def get_cached_json(self, request_url):
+        return self.get_cached(request_url, lambda: self.get_json(request_url))
+
+    def load_roles_map(self):
+        def load():
+            with open(r"roles_map.json") as json_file:
+                return json.load(json_file)
+        return self.cache.get_or_load("roles_map.json", load)
+
+    def post_json(self, request_url, body):
+        user_response = self.check_response(request_url, self.transport.post(request_url, json=body))
+        return user_response.json()
+
+    def iterate_pages(self, request_url, page_size=None, limit=None, state=None, on_page=None):
+        if page_size and limit is not None:
+            page_size = min(page_size, limit)
+        if page_size:
+            separator = "&" if "?" in request_url else "?"
+            request_url = f"{request_url}{separator}$top={page_size}"
+        count = 0
+        while request_url:
+            json_response = self.read_response(request_url, state)
+            records = json_response.get('value', [])
+            if limit is not None and count + len(records) >= limit:
+                yield records[:limit - count]
+                return
+            count += len(records)
+            yield records
+            if on_page is not None:
+                on_page(json_response.get('@odata.nextLink'))
+            if state is not None:
+                state['deltaLink'] = json_response.get('@odata.deltaLink')
+            request_url = json_response.get('@odata.nextLink')
+        if state is not None:
+            state['complete'] = True
+
+    def read_response(self, request_url, state=None):
+        user_response = self.check_response(request_url, self.get_response(request_url))
+        if state is not None:
+            state.setdefault('etag', user_response.headers.get('ETag'))
+        return user_response.json()
+
+    def read_page(self, request_url):
+        json_response = self.read_response(request_url)
+        return json_response.get('value', []), json_response.get('@odata.nextLink')
+
+    def iterate_records(self, request_url, page_size=None, limit=None, state=None):
+        for page in self.iterate_pages(request_url, page_size, limit, state):
+            yield from page
+
+    def event_url(self, endpoint, filter, field, start=None, end=None):
+        return f"{endpoint}?$filter={filter} and {self.date_filter(field, start, end)}"
+
+    def iterate_event_pages(self, endpoint, filter, field, query):
+        # a record limit keeps the newest records, which only one request chain gives
+        if self.shard_pages > 0 and not self.record_limit:
+            pages = self.iterate_sharded_pages(endpoint, filter, field, query)
+        else:
+            pages = self.iterate_serial_pages(self.event_url(endpoint, filter, field), query)
+        for page in pages:
+            if self.checkpoint_seen:
+                page = [record for record in page if record['id'] not in self.checkpoint_seen]
+            yield page
+        with self.lock:
+            self.completed_queries.add(query)
+
+    def iterate_serial_pages(self, request_url, query):
+        resume_log = self.get_resume_log()
+        fetch_url, page_size, on_page = request_url, self.page_size, None
+        if resume_log is not None:
+            entry = resume_log.resume(query, request_url)
+            if entry is not None:
+                for rows in entry["pages"]:
+                    self.resume_rows(query, rows)
+                # the query had reached its last page before the run stopped
+                if entry["next"] is None:
+                    return
+                fetch_url, page_size = entry["next"], None
+            # called once the rows of a page are parsed and before the next page is requested
+            on_page = lambda next_link: resume_log.record(query, request_url, next_link, self.take_rows(query))
+        yield from self.iterate_pages(fetch_url, page_size, self.record_limit, on_page=on_page)
+
+    def iterate_sharded_pages(self, endpoint, filter, field, query):
+        # the filter works in whole seconds, so the shards are cut on whole seconds too
+        start, end = self.fetch_start.replace(microsecond=0), self.window_end.replace(microsecond=0)
+        url_for = lambda shard_start, shard_end: f"{self.event_url(endpoint, filter, field, shard_start, shard_end)}&$top={self.page_size}"
+        resume_log = self.get_resume_log()
+        if resume_log is None:
+            fetch = ShardedFetch(self, url_for, field, start, end, self.shard_workers, self.shard_pages, read_ahead=self.shard_read_ahead)
+            yield from fetch.pages()
+            return
+        fetch = ShardedFetch(self, url_for, field, start, end, self.shard_workers, self.shard_pages, resumed=lambda url: resume_log.resume(query, url),
+                             read_ahead=self.shard_read_ahead)
+        on_page = lambda url, next_link, shards: resume_log.record(query, url, next_link, self.take_rows(query), shards)
+        yield from fetch.pages(on_page, lambda rows: self.resume_rows(query, rows))
+
+    def checkpoint_path(self):
+        name = re.sub(r'[^A-Za-z0-9._-]', '_', f"{self.tenant_id}_{self.sus_user.lower()}")
+        return os.path.join(self.checkpoint_dir, f"{name}.json")
+
+    def resume_path(self):
+        return os.path.splitext(self.checkpoint_path())[0] + ".resume.jsonl"
+
+    def get_resume_log(self):
+        if not self.checkpoint_dir or not self.resume_fetches or self.record_limit:
+            return None
+        with self.lock:
+            if self.resume_log is None:
+                os.makedirs(self.checkpoint_dir, exist_ok=True)
+                # the queries of another window or checkpoint have other filters, so their pages are never reused
+                run = {"version": CHECKPOINT_VERSION, "windowStart": self.window_start.isoformat(), "fetchStart": self.fetch_start.isoformat(),
+                       "windowEnd": self.window_end.isoformat()}
+                self.resume_log = ResumeLog(self.resume_path(), run, resume=self.use_cache)
+            return self.resume_log
+
+    def keep_rows(self, query, rows):
+        if self.resume_log is not None:
+            self.pending_rows.setdefault(query, []).append(rows)
+
+    def take_rows(self, query):
+        rows = {}
+        for columns in self.pending_rows.pop(query, []):
+            for field, column in columns.items():
+                rows.setdefault(field, []).extend(column)
+        return rows
+
+    def resume_rows(self, query, rows):
+        self.add_event_rows(query, rows)
+        with self.lock:
+            self.resumed_pages += 1
+
+    def add_event_rows(self, query, rows):
+        if not rows:
+            return
+        if query in ("initiated", "target"):
+            store = self.audit_initiated if query == "initiated" else self.audit_target
+            store.extend(rows)
+            return
+        with self.lock:
+            self.audit_signin.extend(rows)
+            for ip, app_used, resource in zip(rows["ip"], rows["app_used"], rows["resource"]):
+                ip_object = self.ips.setdefault(ip, {"count": 0, "app_used": set(), "resource": set()})
+                ip_object["count"] += 1
+                ip_object["app_used"].add(app_used)
+                ip_object["resource"].add(resource)
+
+    def load_checkpoint(self):
+        if not self.checkpoint_dir or not self.use_cache or self.record_limit:
+            return False
+        path = self.checkpoint_path()
+        if not os.path.exists(path):
+            return False
+        with open(path, encoding='utf8') as checkpoint_file:
+            checkpoint = json.load(checkpoint_file)
+        high_water_mark = datetime.datetime.fromisoformat(checkpoint['highWaterMark'])
+        # only a window with the same start that ends at or after the checkpoint can be extended
+        if checkpoint.get('version') != CHECKPOINT_VERSION:
+            return False
+        if checkpoint['windowStart'] != self.window_start.isoformat() or high_water_mark > self.window_end:
+            return False
+        self.audit_initiated = EventStore.from_dict(AUDIT_FIELDS, checkpoint['auditInitiated'])
+        self.audit_target = EventStore.from_dict(AUDIT_FIELDS, checkpoint['auditTarget'])
+        self.audit_signin = EventStore.from_dict(SIGNIN_FIELDS, checkpoint['auditSignin'])
+        self.ips = {}
+        for ip, ip_object in checkpoint['ips'].items():
+            self.ips[ip] = {"count": ip_object["count"], "app_used": set(ip_object["app_used"]), "resource": set(ip_object["resource"])}
+        self.checkpoint_seen = set(checkpoint['seen'])
+        self.fetch_start = max(self.window_start, high_water_mark)
+        return True
+
+    def save_checkpoint(self):
+        if not self.checkpoint_dir or self.record_limit:
+            return
+        # a query that did not reach its last page would move the mark past events that were never downloaded
+        if not self.completed_queries.issuperset(EVENT_QUERIES):
+            return
+        # events keep arriving in the audit logs for a while, so the mark trails the current time
+        settled = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=self.checkpoint_lag)
+        # the date filter and the seen ids both work in whole seconds, so the mark is cut to the second too
+        high_water_mark = max(self.fetch_start, min(self.window_end, settled)).replace(microsecond=0)
+        seen = []
+        for store in (self.audit_initiated, self.audit_target, self.audit_signin):
+            for event_id, created in store.rows("id", "created"):
+                if self.parse_event_time(created) >= high_water_mark:
+                    seen.append(event_id)
+        ips = {}
+        for ip, ip_object in self.ips.items():
+            ips[ip] = {"count": ip_object["count"], "app_used": sorted(ip_object["app_used"], key=str), "resource": sorted(ip_object["resource"], key=str)}
+        checkpoint = {
+            "version": CHECKPOINT_VERSION,
+            "windowStart": self.window_start.isoformat(),
+            "highWaterMark": high_water_mark.isoformat(),
+            "seen": seen,
+            "auditInitiated": self.audit_initiated.to_dict(),
+            "auditTarget": self.audit_target.to_dict(),
+            "auditSignin": self.audit_signin.to_dict(),
+            "ips": ips,
+        }
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        path = self.checkpoint_path()
+        with open(path + ".tmp", 'w', encoding='utf8') as checkpoint_file:
+            json.dump(checkpoint, checkpoint_file)
+        os.replace(path + ".tmp", path)
+        # the checkpoint has every event now, the pages of this run are not needed to resume
+        if self.resume_log is not None:
+            self.resume_log.remove()
+
+    def get_response_cache(self):
+        if not self.response_cache_path:
+            return None
+        max_entries = self.settings.getint('responseCacheMaxEntries', fallback=10000)
+        return self.shared_cache.get_or_load(self.response_cache_path, lambda: DiskCache(self.response_cache_path, "responses", max_entries=max_entries))
+
+    def refresh_cached_records(self, request_url, entry):
+        if entry.get('deltaLink'):
+            state = {}
+            records = {record['id']: record for record in entry['records']}
+            for change in self.iterate_records(entry['deltaLink'], state=state):
+                if '@removed' in change:
+                    records.pop(change['id'], None)
+                else:
+                    records.setdefault(change['id'], {}).update(change)
+            return list(records.values()), state
+        if entry.get('etag'):
+            user_response = self.get_response(request_url, headers={'If-None-Match': entry['etag']})
+            if user_response.status_code == 304:
+                return entry['records'], {'etag': entry['etag'], 'deltaLink': None, 'complete': True}
+        return None, None
+
+    def iterate_cached_records(self, request_url, page_size=None):
+        response_cache = self.get_response_cache()
+        if response_cache is None:
+            yield from self.iterate_records(request_url, page_size)
+            return
+        key = f"{self.get_tenant_id()}|{request_url}"
+        entry, stored_at = response_cache.get_entry(key)
+        if entry is not None and self.use_cache:
+            if time.time() - stored_at <= self.response_cache_max_age:
+                tracing.count("cache_hits")
+                yield from entry['records']
+                return
+            records, state = self.refresh_cached_records(request_url, entry)
+            if records is not None:
+                tracing.count("cache_hits")
+                self.store_cached_records(response_cache, key, records, state)
+                yield from records
+                return
+        tracing.count("cache_misses")
+        state = {}
+        records = list(self.iterate_records(request_url, page_size, state=state))
+        self.store_cached_records(response_cache, key, records, state)
+        yield from records
+
+    def store_cached_records(self, response_cache, key, records, state):
+        # only a listing that reached its last page is kept, a cut off one would hide memberships and roles until it expires
+        if state.get('complete'):
+            response_cache.set(key, {'records': records, 'etag': state.get('etag'), 'deltaLink': state.get('deltaLink')})
 
     def is_group_admin(self, groupId):
         endpoint = f'https://graph.microsoft.com/v1.0/groups/{groupId}/memberOf'
         request_url = endpoint
-        user_response = self.user_client.get(request_url)
-        json_response = user_response.json()
-        if not 'value' in json_response or len(json_response['value']) == 0:
-            return ""
-        results = json_response['value']
+        return self.get_cached(request_url, lambda: self.parse_group_roles(self.iterate_records(request_url, self.page_size)))
+
+    def parse_group_roles(self, results):
         group_roles = ""
         for result in results:
             if result['@odata.type'] == '#microsoft.graph.directoryRole':
@@ -57,6 +469,74 @@ class Graph:
                 group_roles += displayName + " ;"
         return group_roles
 
+    def resolve_group_roles(self, group_ids):
+        queue = []
+        for group_id in dict.fromkeys(group_ids):
+            if group_id not in self.group_roles:
+                queue.append((group_id, 1, 0))
+        # failed sub-requests go to the back of the queue so they ride along with later batches
+        while queue:
+            batch = queue[:self.batch_size]
+            queue = queue[self.batch_size:]
+            wait_until = max(not_before for _, _, not_before in batch)
+            if wait_until > time.time():
+                time.sleep(wait_until - time.time())
+            attempts = {}
+            requests_list = []
+            for index, (group_id, attempt, _) in enumerate(batch):
+                attempts[str(index)] = (group_id, attempt)
+                requests_list.append({"id": str(index), "method": "GET", "url": f"/groups/{group_id}/memberOf"})
+            json_response = self.post_json('https://graph.microsoft.com/v1.0/$batch', {"requests": requests_list})
+            answered = set()
+            for response in json_response.get('responses', []):
+                group_id, attempt = attempts[response['id']]
+                answered.add(response['id'])
+                status = response.get('status', 500)
+                body = response.get('body') or {}
+                if status == 200:
+                    results = body.get('value', [])
+                    if '@odata.nextLink' in body:
+                        results = results + list(self.iterate_records(body['@odata.nextLink']))
+                    roles = self.parse_group_roles(results)
+                elif status == 429 or status >= 500:
+                    tracing.count("throttled")
+                    if attempt < self.batch_attempts:
+                        tracing.count("retries")
+                        retry_after = (response.get('headers') or {}).get('Retry-After', 1)
+                        queue.append((group_id, attempt + 1, time.time() + float(retry_after)))
+                        continue
+                    roles = self.is_group_admin(group_id)
+                else:
+                    raise graph_error(f"/groups/{group_id}/memberOf", status, body)
+                with self.lock:
+                    self.group_roles[group_id] = roles
+            for request_id, (group_id, attempt) in attempts.items():
+                if request_id in answered:
+                    continue
+                if attempt < self.batch_attempts:
+                    queue.append((group_id, attempt + 1, 0))
+                else:
+                    roles = self.is_group_admin(group_id)
+                    with self.lock:
+                        self.group_roles[group_id] = roles
+        return self.group_roles
+
+    def fill_group_roles(self, groups_transitive, groups_non_transitive, owned_objects):
+        group_ids = []
+        for groups_dict in (groups_transitive, groups_non_transitive):
+            if groups_dict:
+                group_ids += groups_dict['Id']
+        if isinstance(owned_objects, list):
+            group_ids += [owned['id'] for owned in owned_objects if owned['type'] == 'group']
+        self.resolve_group_roles(group_ids)
+        for groups_dict in (groups_transitive, groups_non_transitive):
+            if groups_dict:
+                groups_dict['GroupRoles'] = [self.group_roles.get(group_id, "") for group_id in groups_dict['Id']]
+        if isinstance(owned_objects, list):
+            for owned in owned_objects:
+                if owned['type'] == 'group':
+                    owned['groupRoles'] = self.group_roles.get(owned['id'], "")
+        return self.group_roles
 
 
     def parse_owned_objects(self, objects):
@@ -69,27 +549,16 @@ class Graph:
             temp_dict["type"] = oType
             temp_dict["id"] = oId
             temp_dict["displayName"] = oDisplayName
-            group_roles = self.is_group_admin(oId) if oType == 'group' else ""
-            temp_dict["groupRoles"] = group_roles
+            temp_dict["groupRoles"] = ""
             self.owned_objects.append(temp_dict)
 
-    def get_owned_objects(self, url='url', pagination=False):
+    def get_owned_objects(self):
         endpoint = f'https://graph.microsoft.com/beta/users/{self.sus_user}/ownedObjects'
         request_url = f'{endpoint}'
-        if pagination:
-            request_url = url
-        user_response = self.user_client.get(request_url)
-        json_response = user_response.json()
-        if not 'value' in json_response or len(json_response['value']) == 0:
-            return "This user does not own any objects."
-        if '@odata.nextLink' in user_response:
-            self.parse_owned_objects(json_response['value'])
-            pagination_url = json_response['@odata.nextLink']
-            self.get_owned_objects(self, pagination_url, pagination=True)
-        self.parse_owned_objects(json_response['value'])
-        if len(self.audit_target) == 0:
+        self.parse_owned_objects(self.iterate_cached_records(request_url, self.page_size))
+        if len(self.owned_objects) == 0:
             return "This user does not own any objects."
-        return user_response.json()
+        return self.owned_objects
     
     def parse_owned_devices(self, objects):
         for object in objects:
@@ -105,38 +574,35 @@ class Graph:
             temp_dict["isCompliant"] = isCompliant
             self.owned_devices.append(temp_dict)
 
-    def get_owned_devices(self, url='url', pagination=False):
+    def get_owned_devices(self):
         endpoint = f'https://graph.microsoft.com/beta/users/{self.sus_user}/ownedDevices'
         request_url = f'{endpoint}'
-        if pagination:
-            request_url = url
-        user_response = self.user_client.get(request_url)
-        json_response = user_response.json()
-        if not 'value' in json_response or len(json_response['value']) == 0:
-            return "This user does not own any devices."
-        if '@odata.nextLink' in user_response:
-            self.parse_owned_devices(json_response['value'])
-            pagination_url = json_response['@odata.nextLink']
-            self.get_owned_devices(self, pagination_url, pagination=True)
-        self.parse_owned_devices(json_response['value'])
-        if len(self.audit_target) == 0:
+        self.parse_owned_devices(self.iterate_cached_records(request_url, self.page_size))
+        if len(self.owned_devices) == 0:
             return "This user does not own any devices."
-        return user_response.json()
+        return self.owned_devices
 
 
     def bad_sigin_errors(self):
-        signin = self.bad_signin
-        error_code_list = [50088, 50131,500021,500022,50053,50135,53011,530034,53010,530032]
+        signin = self.audit_signin.rows("type", "created", "resource", "ip", "app_used", "code", "reason", "details")
         out = []
-        for event in signin:
-            if event["code"] in error_code_list:
-                out.append(event)
+        for type, created, resource, ip, app_used, code, reason, details in signin:
+            if type == "failed" and code in BAD_SIGNIN_CODES:
+                out.append({"created":created,"resource":resource,"ip":ip,"app_used":app_used,"code":code,"reason":reason,"details":details})
         
         return out
                 
     def get_ips(self):
         return self.ips
 
+    def get_tenant_id(self):
+        # tenantId is often left empty, the tenant the user signed in to is in the token
+        if self.tenant_id or self.device_code_credential is None:
+            return self.tenant_id
+        if self.token_tenant_id is None:
+            self.token_tenant_id = token_tenant(self.get_user_token())
+        return self.token_tenant_id
+
     def get_user_token(self):
         graph_scopes = self.settings['graphUserScopes']
         access_token = self.device_code_credential.get_token(graph_scopes)
@@ -147,18 +613,14 @@ class Graph:
         # Only request specific properties
         select = 'displayName,mail,userPrincipalName'
         request_url = f'{endpoint}?$select={select}'
-
-        user_response = self.user_client.get(request_url)
-        return user_response.json()
+        return self.get_json(request_url)
 
     def get_sus_user(self):
         endpoint = f'/users/{self.sus_user}'
         # Only request specific properties
         select = 'id,userPrincipalName,displayName,onPremisesDistinguishedName,onPremisesSyncEnabled,onPremisesUserPrincipalName,onPremisesSecurityIdentifier,createdDateTime,userType,lastPasswordChangeDateTime'
         request_url = f'{endpoint}?$select={select}'
-
-        user_response = self.user_client.get(request_url)
-        return user_response.json()
+        return self.get_cached_json(request_url)
 
     def get_mfa_info(self):
         user = self.get_sus_user()
@@ -166,26 +628,78 @@ class Graph:
         endpoint = 'https://graph.microsoft.com/beta/reports/credentialUserRegistrationDetails'
         mfa_filter = f"userPrincipalName eq '{principalName}'"
         request_url = f'{endpoint}?$filter={mfa_filter}'
-        user_response = self.user_client.get(request_url)
-        json_response = user_response.json()
-        if not 'value' in json_response or len(json_response['value']) == 0:
+        mfa = list(self.iterate_records(request_url, limit=1))
+        if len(mfa) == 0:
             return "This user does not have any MFA configured."
-        mfa = json_response['value']
         data = mfa[0]
         authMetods = data["authMethods"]        
         return authMetods
+    def get_geo_index(self):
+        if not self.geo_database:
+            return None
+        return self.shared_cache.get_or_load(self.geo_database, lambda: GeoIndex.load(self.geo_database))
+
+    def get_geo_cache(self):
+        if not self.geo_cache_path:
+            return None
+        ttl = self.settings.getint('geoCacheTtl', fallback=604800)
+        max_entries = self.settings.getint('geoCacheMaxEntries', fallback=100000)
+        return self.shared_cache.get_or_load(self.geo_cache_path, lambda: DiskCache(self.geo_cache_path, "locations", ttl, max_entries))
+
+    def get_geo_transport(self):
+        with self.lock:
+            if self.geo_transport is None:
+                self.geo_transport = create_geo_transport(self.settings)
+            return self.geo_transport
+
+    def request_location(self, ip):
+        import requests
+        geo_transport = self.get_geo_transport()
+        for attempt in range(self.geo_attempts):
+            # an IP that stays throttled is left without a location, the report does not depend on it
+            try:
+                response = geo_transport.get(f'https://ipapi.co/{ip}/json/', timeout=10)
+            except requests.HTTPError:
+                return None
+            response = response.json()
+            # ipapi.co can also report throttling in a 200 answer
+            if response.get("reason") == "RateLimited":
+                geo_transport.backoff(attempt)
+                continue
+            return response
+        return None
+
     def get_location(self,ip):
-        response = requests.get(f'https://ipapi.co/{ip}/json/').json()
+        geo_index = self.get_geo_index()
+        if geo_index is not None:
+            location_data = geo_index.lookup(ip)
+            if location_data is not None:
+                return location_data
+        if self.geo_offline:
+            return {"city": None, "region": None, "country": None}
+        geo_cache = self.get_geo_cache()
+        if geo_cache is not None:
+            location_data = geo_cache.get(ip)
+            tracing.count("cache_misses" if location_data is None else "cache_hits")
+            if location_data is not None:
+                return location_data
+        response = self.request_location(ip)
+        if response is None:
+            return {"city": None, "region": None, "country": None}
         location_data = {
             "city": response.get("city"),
             "region": response.get("region"),
             "country": response.get("country_name")
         }
+        if geo_cache is not None and not response.get("error"):
+            geo_cache.set(ip, location_data)
         return location_data
     
     def get_ips_loc(self,ips_dict):
+        with self.tracer.span("geolocate"), ThreadPoolExecutor(max_workers=self.geo_workers) as executor:
+            locations = dict(zip(ips_dict.keys(), executor.map(self.tracer.wrap(self.get_location), ips_dict.keys())))
         for ip in ips_dict.keys():
-            ip_loc = self.get_location(ip)
+            ip_loc = locations[ip]
             ips_dict[ip]['City'] = ip_loc['city']
             ips_dict[ip]['region'] = ip_loc['region']
             ips_dict[ip]['country'] = ip_loc['country']
@@ -198,13 +712,11 @@ class Graph:
         endpoint = '/roleManagement/directory/roleAssignments'
         role_filter = f"principalId eq '{id}'"
         request_url = f'{endpoint}?$filter={role_filter}'
-        user_response = self.user_client.get(request_url)
-        json_response = user_response.json()
-        if not 'value' in json_response or len(json_response['value']) == 0:
+        assignments = list(self.iterate_cached_records(request_url))
+        if len(assignments) == 0:
             return "This user has no roles."
-        with open(r"roles_map.json") as json_file:
-            json_data = json.load(json_file)
-        for role in json_response['value']:
+        json_data = self.load_roles_map()
+        for role in assignments:
             role_id = role['roleDefinitionId']
             roles.append(json_data[role_id])
         return roles
@@ -216,13 +728,11 @@ class Graph:
         endpoint_eligible = '/roleManagement/directory/roleEligibilityScheduleInstances'
         role_filter = f"principalId eq '{id}'"
         request_url_eligible = f'{endpoint_eligible}?$filter={role_filter}'
-        user_response = self.user_client.get(request_url_eligible)
-        json_response = user_response.json()
-        if not 'value' in json_response or len(json_response['value']) == 0:
+        eligibilities = list(self.iterate_cached_records(request_url_eligible))
+        if len(eligibilities) == 0:
             return "This user is not eligible to any role."
-        with open(r"roles_map.json") as json_file:
-            json_data = json.load(json_file)
-        for role in json_response['value']:
+        json_data = self.load_roles_map()
+        for role in eligibilities:
             role_id = role['roleDefinitionId']
             eligible_roles.append(json_data[role_id])
         return eligible_roles          
@@ -231,11 +741,10 @@ class Graph:
         endpoint = f'/users/{self.sus_user}/memberOf/microsoft.graph.group'
         select = 'id,displayName,description'
         request_url = f'{endpoint}?$select={select}'
-        user_response = self.user_client.get(request_url)
-        json_response = user_response.json()
-        if not 'value' in json_response or len(json_response['value']) == 0:
+        groups = list(self.iterate_cached_records(request_url, self.page_size))
+        if len(groups) == 0:
             return {}
-        group_dict = self.parse_sus_groups(json_response['value'], transitive="False")
+        group_dict = self.parse_sus_groups(groups, transitive="False")
         return group_dict
     
     def parse_sus_groups(self, groups, transitive):
@@ -249,7 +758,7 @@ class Graph:
             name_list.append(group['displayName'])
             description_list.append(group['description'])
             id_list.append(group['id'])
-            roles_list.append(self.is_group_admin(group['id']))
+            roles_list.append("")
             transitive_list.append(transitive)
         groups_dict['GroupName'] = name_list
         groups_dict['Description'] = description_list
@@ -262,157 +771,112 @@ class Graph:
         endpoint = f'/users/{self.sus_user}/transitiveMemberOf/microsoft.graph.group'
         select = 'id,displayName,description'
         request_url = f'{endpoint}?$select={select}'
-        user_response = self.user_client.get(request_url)
-        json_response = user_response.json()
-        if not 'value' in json_response or len(json_response['value']) == 0:
+        groups = list(self.iterate_cached_records(request_url, self.page_size))
+        if len(groups) == 0:
             return {}
-        group_dict = self.parse_sus_groups(json_response['value'], transitive="True")
+        group_dict = self.parse_sus_groups(groups, transitive="True")
         return group_dict
 
 
-    def get_audit_target(self, url='/auditLogs/directoryAudits', pagination=False):
+    def get_audit_target(self):
         sus = self.sus_user
         endpoint = '/auditLogs/directoryAudits'
         filter = f"targetResources/any(t:t/userPrincipalName eq  '{sus}')"
-        request_url = f"{endpoint}?$filter={filter}"
-        if pagination:
-            request_url = url
-
-        user_response = self.user_client.get(request_url)
-        json_response = user_response.json()
-        if not 'value' in json_response or len(json_response['value']) == 0:
-            return "No operations have been performed on this user."
-        if '@odata.nextLink' in user_response:
-            self.parse_audit(json_response['value'], "target")
-            pagination_url = json_response['@odata.nextLink']
-            self.get_audit_target(self, pagination_url, pagination=True)
-        self.parse_audit(json_response['value'], "target")
+        self.parse_audit(self.iterate_event_pages(endpoint, filter, 'activityDateTime', "target"), "target")
         if len(self.audit_target) == 0:
             return "No operations have been performed on this user."
 
 
-    def get_audit_initiated(self, url='/auditLogs/directoryAudits', pagination=False):
+    def get_audit_initiated(self):
         sus = self.sus_user
         endpoint = '/auditLogs/directoryAudits'
         filter = f"initiatedBy/user/userPrincipalName eq '{sus}'"
-        request_url = f"{endpoint}?$filter={filter}"
-        if pagination:
-            request_url = url
-        
-        user_response = self.user_client.get(request_url)
-        json_response = user_response.json()
-        if not 'value' in json_response or len(json_response['value']) == 0:
-            return "This user has not performed any action."
-        if '@odata.nextLink' in user_response:
-            self.parse_audit(json_response['value'], "initiated")
-            pagination_url = json_response['@odata.nextLink']
-            self.get_audit_initiated(self, pagination_url, pagination=True)
-        self.parse_audit(json_response['value'], "initiated")
+        self.parse_audit(self.iterate_event_pages(endpoint, filter, 'activityDateTime', "initiated"), "initiated")
         if len(self.audit_initiated) == 0:
             return "This user has not performed any action."
 
-    def parse_audit(self, audit, func):
-        start = datetime.datetime.strptime(self.start_date, '%Y-%m-%d').date()
-        end = datetime.datetime.strptime(self.end_date, '%Y-%m-%d').date()
-        for event in audit:
-            temp_dict = {}
-            targets_output = "<br>Targets:<br>"
-            string_initiate = ""
-            category = event['category']
-            activity = event['activityDisplayName']
-            created = event['activityDateTime']
-            id = event['id']
-            result = event['result']
-            if category not in self.not_accept_category or activity in self.accept_activity:
-                targets = event['targetResources']
-                for target in targets:
-                
-                    target_id = target['id']
-                    target_displayName = target['displayName']
-                    target_type = target['type']
-                    
-                    tagret_string = f"Type: {target_type}, Id: {target_id}, DisplayName: {target_displayName} "
-                    if target_type == "User":
-                        target_upn = target['userPrincipalName']
-                        tagret_string += f", UPN: {target_upn} "
-                    targets_output += tagret_string
-                    targets_output += """;<br>"""
-
-                initiate_user = event['initiatedBy']['user']
-                initiate_app = event['initiatedBy']['app']
-                if initiate_user:
-                    user_name = initiate_user['userPrincipalName']
-                    string_initiate += f"User: userPrincipalName: {user_name} ; "
-                if initiate_app:
-                    app_name = initiate_app['displayName']
-                    service_id = initiate_app['servicePrincipalId']
-                    string_initiate += f"App: displayName: {app_name}, servicePrincipalId: {service_id} ;"
+    def window_mask(self, created_column):
+        import pandas as pd
+        created = pd.to_datetime(created_column, utc=True, format="ISO8601")
+        return (created >= self.window_start) & (created < self.window_end)
+
+    def page_column(self, frame, name):
+        if name in frame:
+            column = frame[name].astype(object)
+            return column.where(column.notna(), None).tolist()
+        return [None] * len(frame)
+
+    def parse_audit(self, pages, func):
+        import pandas as pd
+        store = self.audit_initiated if func == "initiated" else self.audit_target
+        columns = ['id', 'category', 'activityDisplayName', 'activityDateTime', 'result', 'targetResources', 'initiatedBy']
+        for page in pages:
+            if len(page) == 0:
+                continue
+            frame = pd.DataFrame.from_records(page, columns=columns)
+            frame = frame[self.window_mask(frame['activityDateTime'])]
+            tracing.count("rows_parsed", len(page))
+            tracing.count("rows_kept", len(frame))
+            relevant = ~frame['category'].isin(self.not_accept_category) | frame['activityDisplayName'].isin(self.accept_activity)
+            # only the nested target and initiator objects of relevant rows are walked in Python
+            targets = [compact_targets(target) if keep else None for target, keep in zip(frame['targetResources'], relevant)]
+            if func == "target":
+                initiated_by = [compact_initiated_by(initiator) if keep else None for initiator, keep in zip(frame['initiatedBy'], relevant)]
             else:
-                targets_output = "Not relevant"
-            created_temp = created.split(".")[0]
-            created_time = datetime.datetime.strptime(created_temp, '%Y-%m-%dT%H:%M:%S').date()
-            
-            if created_time > start and created_time < end:
-                temp_dict["id"] = id
-                temp_dict["category"] = category
-                temp_dict["activity"] = activity
-                temp_dict["created"] = created
-                temp_dict["result"] = result
-                if(func == "initiated"):
-                    temp_dict["Information"] = targets_output
-                    self.audit_initiated.append(temp_dict)
-                if(func == "target"):
-                    targets_output += "InitiatedBy:<br>" + string_initiate
-                    temp_dict["Information"] = targets_output
-                    self.audit_target.append(temp_dict)
+                initiated_by = [None] * len(frame)
+            rows = {
+                "id": frame['id'].tolist(),
+                "category": frame['category'].tolist(),
+                "activity": frame['activityDisplayName'].tolist(),
+                "created": frame['activityDateTime'].tolist(),
+                "result": frame['result'].tolist(),
+                "targets": targets,
+                "initiated_by": initiated_by,
+            }
+            store.extend(rows)
+            self.keep_rows(func, rows)
     
     def create_graph_initiated(self):
-        source = pd.DataFrame(self.audit_initiated)
-        fig = px.scatter(source, x=source['created'], y=source['activity'],color="result", title=f"Initiated Activities by {self.sus_user}",
-             hover_data=[source['Information']],
+        source = self.audit_initiated.to_frame(["created", "activity", "result", "targets"])
+        return self.charts.timeline(source, "created", "activity", "result", f"Initiated Activities by {self.sus_user}",
              labels={
                      "created": "Time",
                      "activity": "Activity",
-                 })
-        fig.update_layout(
-            hoverlabel=dict(
-                bgcolor="white",
-                font_size=14,
-            )
-        )
-        fig.update_layout(paper_bgcolor=" #e6f0ff")
-        url = fig.write_html("report_initiated.html")
+                 },
+             layout=dict(
+                 hoverlabel=dict(
+                     bgcolor="white",
+                     font_size=14,
+                 ),
+                 paper_bgcolor=" #e6f0ff",
+             ),
+             chart_id="chart-initiated",
+             hover=(format_initiated_information, ["targets"]))
 
 
     def create_graph_target(self):
-        source = pd.DataFrame(self.audit_target)
-        fig = px.scatter(source, x=source['created'], y=source['activity'],color="result", title=f"Activities performed on {self.sus_user}", 
-            hover_data=[source['Information']],
+        source = self.audit_target.to_frame(["created", "activity", "result", "targets", "initiated_by"])
+        return self.charts.timeline(source, "created", "activity", "result", f"Activities performed on {self.sus_user}",
             labels={
                      "created": "Time",
                      "activity": "Activity",
-                 })
-        fig.update_layout(
-            hoverlabel=dict(
-                bgcolor="white",
-                font_size=14,
-            )
-        )
-        fig.update_layout(paper_bgcolor="  #e6f0ff")
-        url = fig.write_html("report_target.html")
+                 },
+            layout=dict(
+                hoverlabel=dict(
+                    bgcolor="white",
+                    font_size=14,
+                ),
+                paper_bgcolor="  #e6f0ff",
+            ),
+            chart_id="chart-target",
+            hover=(format_target_information, ["targets", "initiated_by"]))
 
 
     def get_audit_signIn_success(self):
         sus = self.sus_user.lower()
         endpoint = '/auditLogs/signIns'
         filter = f"userPrincipalName eq '{sus}' and status/errorCode eq 0"
-        request_url = f"{endpoint}?$filter={filter}"
-
-        user_response = self.user_client.get(request_url)
-        json_response = user_response.json()
-        if not 'value' in json_response or len(json_response['value']) == 0:
-            return "No logs"
-        self.parse_signin(json_response['value'], "success")
+        self.parse_signin(self.iterate_event_pages(endpoint, filter, 'createdDateTime', "success"), "success")
         if len(self.audit_signin) == 0:
             return "No logs"
         
@@ -422,87 +886,118 @@ class Graph:
         sus = self.sus_user.lower()
         endpoint = '/auditLogs/signIns'
         filter = f"userPrincipalName eq '{sus}' and status/errorCode ne 0"
-        request_url = f"{endpoint}?$filter={filter}"
-
-        user_response = self.user_client.get(request_url)
-        json_response = user_response.json()
-        if not 'value' in json_response or len(json_response['value']) == 0:
-            return "No logs"
-        self.parse_signin(json_response['value'], "failed")
+        self.parse_signin(self.iterate_event_pages(endpoint, filter, 'createdDateTime', "failed"), "failed")
         if len(self.audit_signin) == 0:
             return "No logs"
     
 
-    def parse_signin(self, audit, func):
-        start = datetime.datetime.strptime(self.start_date, '%Y-%m-%d').date()
-        end = datetime.datetime.strptime(self.end_date, '%Y-%m-%d').date()
-        for event in audit:
-            temp_dict = {}
-            created = event['createdDateTime']
-            resource = event['resourceDisplayName']
-            interactive = event['isInteractive']
-            ip = event['ipAddress']
-            app_used = event['clientAppUsed']
-
-            hover_string = f"<br>Interactive: {interactive}<br>ip: {ip}<br>app used: {app_used}"
+    def parse_signin(self, pages, func):
+        import pandas as pd
+        for page in pages:
+            if len(page) == 0:
+                continue
+            frame = pd.json_normalize(page, max_level=2)
+            frame = frame[self.window_mask(frame['createdDateTime'])]
+            tracing.count("rows_parsed", len(page))
+            tracing.count("rows_kept", len(frame))
+            if len(frame) == 0:
+                continue
             if func == "failed":
-                status_dict = event['status']
-                code = status_dict['errorCode']
-                reason = status_dict['failureReason']
-                details = status_dict['additionalDetails']
-                hover_string+= f"<br>code: {code} ; reason: {reason} ; details: {details}"
-            created_temp = created.split("Z")[0]
-            created_time = datetime.datetime.strptime(created_temp, '%Y-%m-%dT%H:%M:%S').date()
-            
-            if created_time > start and created_time < end:
-                temp_dict["type"] = func
-                temp_dict["created"] = created
-                temp_dict["resource"] = resource
-                temp_dict["Information"] = hover_string
-                self.audit_signin.append(temp_dict)
-                if self.ips.get(ip) != None:
-                    ip_object = self.ips[ip]
-                    ip_object["count"] += 1
-                    ip_object["app_used"].add(app_used)
-                    ip_object["resource"].add(resource)
-                else:
-                    self.ips[ip] = {"count":1, "app_used":set([app_used]), "resource":set([resource])}
-                if func == "failed":
-                    bad_dict = {"created":created,"resource":resource,"ip":ip,"app_used":app_used,"code":code,"reason":reason,"details":details}
-                    self.bad_signin.append(bad_dict)
-
-
+                codes = self.page_column(frame, 'status.errorCode')
+                reasons = self.page_column(frame, 'status.failureReason')
+                details = self.page_column(frame, 'status.additionalDetails')
+            else:
+                codes = reasons = details = [None] * len(frame)
+            grouped = frame.groupby('ipAddress', sort=False, dropna=False)
+            counts = grouped.size()
+            apps = grouped['clientAppUsed'].agg(set)
+            resources = grouped['resourceDisplayName'].agg(set)
+            rows = {
+                "id": frame['id'].tolist(),
+                "type": [func] * len(frame),
+                "created": frame['createdDateTime'].tolist(),
+                "resource": frame['resourceDisplayName'].tolist(),
+                "interactive": frame['isInteractive'].tolist(),
+                "ip": frame['ipAddress'].tolist(),
+                "app_used": frame['clientAppUsed'].tolist(),
+                "code": codes,
+                "reason": reasons,
+                "details": details,
+                "latitude": self.page_column(frame, 'location.geoCoordinates.latitude'),
+                "longitude": self.page_column(frame, 'location.geoCoordinates.longitude'),
+            }
+            self.keep_rows(func, rows)
+            with self.lock:
+                self.audit_signin.extend(rows)
+                for ip, count, app_used, resource in zip(counts.index, counts.tolist(), apps.tolist(), resources.tolist()):
+                    if self.ips.get(ip) != None:
+                        ip_object = self.ips[ip]
+                        ip_object["count"] += count
+                        ip_object["app_used"].update(app_used)
+                        ip_object["resource"].update(resource)
+                    else:
+                        self.ips[ip] = {"count":count, "app_used":app_used, "resource":resource}
 
     def create_graph_signin(self):
-        signin = pd.DataFrame(self.audit_signin)
-        fig = px.scatter(signin, x=signin['created'], y=signin['resource'], color="type",
-                 title="Sign-in graph", hover_data=[signin['Information']],
+        signin = self.audit_signin.to_frame(["created", "resource", "type", "interactive", "ip", "app_used", "code", "reason", "details"])
+        return self.charts.timeline(signin, "created", "resource", "type", "Sign-in graph",
                  labels={
                      "created": "Time",
                      "resource": "Resource",
                      "type": "Login status"
-                 }
-                )
-        fig.update_layout(paper_bgcolor=" #e6f0ff")
-        url = fig.write_html("report_signin.html")
+                 },
+                 layout=dict(paper_bgcolor=" #e6f0ff"),
+                 chart_id="chart-signin",
+                 hover=(format_signin_information, ["type", "interactive", "ip", "app_used", "code", "reason", "details"]))
 
-    def generate_report(self, initiated, target, signin,ips, signin_errors):
-        ips = self.get_ips_loc(ips)
+    def fetch_owned_objects(self):
         self.get_owned_objects()
-        owned_objects = self.owned_objects if self.owned_objects else "This user does not own any objects."
+        return self.owned_objects if self.owned_objects else "This user does not own any objects."
+
+    def fetch_owned_devices(self):
         self.get_owned_devices()
-        owned_devices = self.owned_devices if self.owned_devices else "This user does not own any devices."
-        groups_transitive = self.get_sus_groups_transitive()
-        groups_non_transitive = self.get_sus_groups()
+        return self.owned_devices if self.owned_devices else "This user does not own any devices."
+
+    def add_report_tasks(self, orchestrator):
+        orchestrator.add_task("owned_objects", self.fetch_owned_objects)
+        orchestrator.add_task("owned_devices", self.fetch_owned_devices)
+        orchestrator.add_task("groups_transitive", self.get_sus_groups_transitive)
+        orchestrator.add_task("groups_non_transitive", self.get_sus_groups)
+        orchestrator.add_task("user", self.get_sus_user)
+        orchestrator.add_task("roles", self.get_sus_roles)
+        orchestrator.add_task("eligible_roles", self.get_eligible_roles)
+        orchestrator.add_task("mfa", self.get_mfa_info)
+        orchestrator.add_task("group_roles", self.fill_group_roles, depends_on=["groups_transitive", "groups_non_transitive", "owned_objects"])
+
+    def generate_report(self, results):
         groups_dict = {}
-        groups_dict["transitive"] = groups_transitive
-        groups_dict["nonTransitive"] = groups_non_transitive
-        user = self.get_sus_user()
-        roles = self.get_sus_roles()
-        eligible_roles = self.get_eligible_roles()
+        groups_dict["transitive"] = results["groups_transitive"]
+        groups_dict["nonTransitive"] = results["groups_non_transitive"]
         roles_dict = {}
-        roles_dict["Roles"] = roles
-        roles_dict["Eligible"] = eligible_roles
-        mfa = self.get_mfa_info()
-        gui: Gui = Gui(user, groups_dict, roles_dict, initiated, target, signin, ips, signin_errors, mfa, owned_objects, owned_devices)
-        gui.generate_report(self.out_file)
+        roles_dict["Roles"] = results["roles"]
+        roles_dict["Eligible"] = results["eligible_roles"]
+        gui: Gui = Gui(results["user"], groups_dict, roles_dict, results["initiated"], results["target"], results["signin"], results["ips"], results["signin_errors"], results["mfa"], results["owned_objects"], results["owned_devices"],
+                       tracer=self.tracer, diagnostics=self.report_diagnostics)
+        with self.tracer.span("render"):
+            gui.generate_report(self.out_file)
+
+    def export_path(self):
+        return self.export_directory or os.path.splitext(self.out_file)[0] + "_data"
+
+    def export_datasets(self, results):
+        if not self.export_format:
+            return None
+        from export import export_report
+        with self.tracer.span("export"):
+            return export_report(self, results, self.export_path(), self.export_format)
+
+    def trace_path(self):
+        return os.path.splitext(self.out_file)[0] + ".trace.json"
+
+    def write_trace(self):
+        if not self.write_trace_file:
+            return None
+        path = self.trace_path()
+        transport = self.transport.stats() if self.transport else None
+        self.tracer.write(path, user=self.sus_user, window=[self.window_start.isoformat(), self.window_end.isoformat()], transport=transport)
+        return path
@@ -1,17 +1,11 @@
 # gui.py>
 
-import datetime
-import json
-from configparser import SectionProxy
-from azure.identity import DeviceCodeCredential, ClientSecretCredential
-from msgraph.core import GraphClient
-import plotly.express as px
-import pandas as pd
-import plotly.graph_objects as go
+from tables import render_table, render_columns, TABLE_ASSETS
+from tracing import Tracer
 
 
 class Gui:    
-    def __init__(self, sus, groups_dict, roles_dict, initiated, target, signin,ips,signin_erros, mfa, owned_objects, owned_devices):
+    def __init__(self, sus, groups_dict, roles_dict, initiated, target, signin,ips,signin_erros, mfa, owned_objects, owned_devices, tracer=None, diagnostics=False):
         self.sus = sus
         self.roles = roles_dict["Roles"]
         self.eligible_roles = roles_dict["Eligible"]
@@ -25,25 +19,21 @@ class Gui:
         self.mfa = mfa
         self.owned_objects = owned_objects
         self.owned_devices = owned_devices
+        self.tracer = tracer or Tracer()
+        self.diagnostics = diagnostics
 
     def parse_owned_objects(self):
         if self.owned_objects == "This user does not own any objects.":
             return self.owned_objects
     
-        objects = pd.DataFrame(data=self.owned_objects)
-        objects = objects.fillna(' ')
-        objects_out = objects.style.to_html(classes='table table-stripped')
-        return objects_out
+        return render_table(self.owned_objects)
     
 
     def parse_owned_devices(self):
         if self.owned_devices == "This user does not own any devices.":
             return self.owned_devices
     
-        objects = pd.DataFrame(data=self.owned_devices)
-        objects = objects.fillna(' ')
-        objects_out = objects.style.to_html(classes='table table-stripped')
-        return objects_out
+        return render_table(self.owned_devices)
     
 
     def parse_mfa(self):
@@ -57,18 +47,14 @@ class Gui:
     def parse_bad_signin(self):
         if len(self.signin_erros) == 0:
             return "No suspicious events."
-        errors = pd.DataFrame(data=self.signin_erros)
-        errors = errors.fillna(' ')
-        errors_html = errors.style.to_html(classes='table table-stripped')
-        return errors_html
+        return render_table(self.signin_erros)
 
     def parse_ips(self):
         if len(self.ips) == 0:
             return "No IPs."
-        sus_ips = pd.DataFrame(data=self.ips)
-        sus_ips = sus_ips.fillna(' ')
-        ips_out = sus_ips.style.to_html(classes='table table-stripped')
-        return ips_out
+        sus_ips = [dict(info, ip=ip) for ip, info in self.ips.items()]
+        columns = ["ip"] + list(dict.fromkeys(key for info in self.ips.values() for key in info))
+        return render_table(sus_ips, columns)
 
 
     def create_roles_string(self):
@@ -90,53 +76,56 @@ class Gui:
         return roles_string
 
     def create_groups_output(self):
-        if self.groups == "None" and self.transitive_groups == "None":
+        if not self.transitive_groups or self.transitive_groups == "None":
             return "This user is not a member of any group."
-        transitive_df = pd.DataFrame(data=self.transitive_groups)
-        groups_df = pd.DataFrame(data=self.groups)
-        temp_df = transitive_df.assign(InGroups=transitive_df.Id.isin(groups_df.Id).astype(int))
-        temp_df.loc[temp_df.InGroups == 1, "Transitive"] = "False"
-        groups_data_df = temp_df.drop("InGroups", axis=1)
-        groups_html = groups_data_df.style.to_html(classes='table table-stripped')
-        return groups_html
+        direct_ids = set(self.groups['Id']) if self.groups and self.groups != "None" else set()
+        groups_data = dict(self.transitive_groups)
+        groups_data['Transitive'] = ["False" if group_id in direct_ids else transitive for group_id, transitive in zip(groups_data['Id'], groups_data['Transitive'])]
+        return render_columns(groups_data)
+
+    def plotly_script(self):
+        charts = [self.initiated, self.target, self.signin]
+        if all(chart in ("This user has not performed any action.", "No operations have been performed on this user.", "This user has not logged in.") for chart in charts):
+            return ""
+        # the chart fragments are rendered without plotly.js, it is embedded here once for the whole report
+        from plotly.offline import get_plotlyjs
+        return '<script type="text/javascript">' + get_plotlyjs() + '</script>'
+
+    def create_diagnostics(self):
+        if not self.diagnostics:
+            return ""
+        # spans that are still running, like the render itself, show their duration so far
+        return '''
+        <p class="thick">Run diagnostics</p><br>
+        <button type="button" class="collapsible">Click to show run diagnostics</button>
+<div class="content">
+   ''' + render_table(self.tracer.rows()) + '''
+</div>'''
 
     def generate_report(self, out_file):
-        errors_html = self.parse_bad_signin()
-        groups_html = self.create_groups_output()
-        roles_html = self.create_roles_string()
-        eligible_html = self.create_eligible_roles_string()
-        mfa_html = self.parse_mfa()
-        owned_objects = self.parse_owned_objects()
-        owned_devices = self.parse_owned_devices()
+        with self.tracer.span("tables"):
+            errors_html = self.parse_bad_signin()
+            groups_html = self.create_groups_output()
+            roles_html = self.create_roles_string()
+            eligible_html = self.create_eligible_roles_string()
+            mfa_html = self.parse_mfa()
+            owned_objects = self.parse_owned_objects()
+            owned_devices = self.parse_owned_devices()
         if self.sus['onPremisesSyncEnabled']:
             sync_data = f"SID: {self.sus['onPremisesSecurityIdentifier']}, UserPrincipalName: {self.sus['onPremisesUserPrincipalName']}"
         else:
             sync_data = "User is not synced."
         
-        if self.initiated == "This user has not performed any action.":
-            initiated_html = self.initiated
-        else:
-            #with open(r"report_initiated.html", 'r') as f:
-            f = open(r"report_initiated.html", encoding="utf8")
-            initiated_html = f.read()
-        
-        if self.target == "No operations have been performed on this user.":
-            target_html = self.target
-        else:
-            #with open(r"report_target.html", 'r') as f:
-            f = open(r"report_target.html", encoding="utf8")
-            target_html = f.read()
-                #target_html = f.read()
-
-        if self.signin == "This user has not logged in.":
-            sigin_html = self.signin
-            sus_ips = "No IPs."
-        else:
-            #with open(r"report_signin.html", 'r') as f:
-            #    sigin_html = f.read()
-            f = open(r"report_signin.html", encoding="utf8")
-            sigin_html = f.read()
-            sus_ips = self.parse_ips()
+        initiated_html = self.initiated
+        target_html = self.target
+        sigin_html = self.signin
+        with self.tracer.span("ip table"):
+            if self.signin == "This user has not logged in.":
+                sus_ips = "No IPs."
+            else:
+                sus_ips = self.parse_ips()
+        plotly_js = self.plotly_script()
+        diagnostics_html = self.create_diagnostics()
         
         html_string = '''
 <!doctype html>
@@ -144,6 +133,7 @@ class Gui:
     <head>
         <meta charset="UTF-8">
         <title>Report</title>
+        ''' + plotly_js + TABLE_ASSETS + '''
         <style>
             section { 
                 text-align: center;
@@ -261,7 +251,7 @@ class Gui:
                 <button type="button" class="collapsible">Click to show MFA information</button>
 <div class="content">
    ''' + mfa_html + '''
-</div> 
+</div> ''' + diagnostics_html + '''
     
     </body>
     <script>
@@ -285,5 +275,5 @@ for (i = 0; i < coll.length; i++) {
         #fw = open(r"report.html", encoding="utf8")
         #fw.write(html_string)
         #fw.close()
-        with open(out_file, 'w', encoding = 'utf8') as fw:
+        with self.tracer.span("write"), open(out_file, 'w', encoding = 'utf8') as fw:
             fw.write(html_string)
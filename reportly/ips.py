@@ -1,49 +1,101 @@
-from statistics import median
-import requests
+EARTH_RADIUS_KM = 6371.0
 
 class IPS:
-    
-    def __init__(self, ips_dict):
+
+    def __init__(self, ips_dict, signins=None, travel_speed_kmh=900, travel_min_km=100):
         self.ips_dict = ips_dict
-        self.median_out_ips = []
-    
-    
-    def get_ip_loc(self, ip):
-        response = requests.get(f'https://ipapi.co/{ip}/json/').json()
-        location_data = {
-            "ip": ip,
-            "city": response.get("city"),
-            "region": response.get("region"),
-            "country": response.get("country_name")
-        }
-        return location_data
-
-    def analyze_ips(self):
-        ips_dict = self.ips_dict
-        ips_count = len(ips_dict.keys())
-        sigin_list = []
-        ips_login_count = 0
-        for ip in ips_dict:
-            data = ips_dict[ip]
-            ips_login_count = ips_login_count + data["count"]
-            sigin_list.append(data["count"])
-        
-        #sorted_list = sorted(sigin_list)
-        #median_loc = int(len(sigin_list) / 2)
-        #median_val = sorted_list[median_loc]
-
-        for ip in ips_dict:
-            #data = ips_dict[ip]
-            self.median_out_ips.append(ip)
-            #if data["count"] < median_val:
-                #div_val = abs(data["count"] - median_val)/median_val
-                #if div_val*100 >= 100:
-            #        self.median_out_ips.append(ip)
+        self.signins = signins
+        self.travel_speed_kmh = travel_speed_kmh
+        self.travel_min_km = travel_min_km
+        self.suspicious_ips = []
+        self.scores = {}
+
+    def signin_arrays(self, ips):
+        import numpy as np
+        import pandas as pd
+        created = pd.to_datetime(pd.Series(self.signins.column("created"), dtype=object), utc=True, format="ISO8601")
+        times = created.dt.tz_localize(None).to_numpy().astype("datetime64[ms]").astype(np.int64)
+        codes = pd.Index(ips).get_indexer(self.signins.column("ip"))
+        apps = pd.factorize(pd.Series(self.signins.column("app_used"), dtype=object), use_na_sentinel=False)[0]
+        resources, resource_values = pd.factorize(pd.Series(self.signins.column("resource"), dtype=object), use_na_sentinel=False)
+        combos = apps.astype(np.int64) * max(1, len(resource_values)) + resources
+        latitude = np.array(self.signins.column("latitude"), dtype=float)
+        longitude = np.array(self.signins.column("longitude"), dtype=float)
+        known = codes >= 0
+        return times[known], codes[known], combos[known], latitude[known], longitude[known]
+
+    def volume_scores(self, counts):
+        import numpy as np
+        # robust z-score, an IP far below the median sign-in count stands out
+        median = np.median(counts)
+        mad = 1.4826 * np.median(np.abs(counts - median))
+        robust_z = (median - counts) / max(mad, 1.0)
+        return np.clip(robust_z / 3, 0, 1)
+
+    def first_seen_scores(self, times, codes, count):
+        import numpy as np
+        first_seen = np.full(count, np.iinfo(np.int64).max)
+        np.minimum.at(first_seen, codes, times)
+        span = max(1, times.max() - times.min())
+        return np.clip((first_seen - times.min()) / span, 0, 1)
+
+    def combo_scores(self, combos, codes, count):
+        import numpy as np
+        # the rarest app and resource pair an IP was used for, 1 when it is one in a thousand sign-ins or rarer
+        _, inverse, combo_counts = np.unique(combos, return_inverse=True, return_counts=True)
+        frequency = combo_counts[inverse] / len(combos)
+        rarest = np.ones(count)
+        np.minimum.at(rarest, codes, frequency)
+        return np.clip(-np.log10(rarest) / 3, 0, 1)
+
+    def travel_counts(self, times, codes, latitude, longitude, count):
+        import numpy as np
+        located = ~(np.isnan(latitude) | np.isnan(longitude))
+        order = np.argsort(times[located], kind="stable")
+        times, codes = times[located][order], codes[located][order]
+        latitude, longitude = np.radians(latitude[located][order]), np.radians(longitude[located][order])
+        if len(times) < 2:
+            return np.zeros(count, dtype=np.int64)
+        # haversine distance between each sign-in and the one before it
+        half_chord = (np.sin(np.diff(latitude) / 2) ** 2
+                      + np.cos(latitude[:-1]) * np.cos(latitude[1:]) * np.sin(np.diff(longitude) / 2) ** 2)
+        distance = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(half_chord, 0, 1)))
+        hours = np.diff(times) / 3600000
+        impossible = (distance > self.travel_min_km) & (distance > self.travel_speed_kmh * hours)
+        return np.bincount(codes[1:][impossible], minlength=count)
+
+    def analyze_ips(self, top=20, min_score=0.0):
+        import numpy as np
+        ips = list(self.ips_dict)
+        if len(ips) == 0:
+            return self.suspicious_ips
+        counts = np.array([self.ips_dict[ip]["count"] for ip in ips], dtype=float)
+        components = {"low volume": self.volume_scores(counts)}
+        weights = {"low volume": 1.0, "first seen late": 1.0, "rare app and resource": 1.0, "impossible travel": 2.0}
+        travel = np.zeros(len(ips), dtype=np.int64)
+        if self.signins is not None and len(self.signins) > 0:
+            times, codes, combos, latitude, longitude = self.signin_arrays(ips)
+            if len(times) > 0:
+                components["first seen late"] = self.first_seen_scores(times, codes, len(ips))
+                components["rare app and resource"] = self.combo_scores(combos, codes, len(ips))
+                travel = self.travel_counts(times, codes, latitude, longitude, len(ips))
+                components["impossible travel"] = np.minimum(travel, 1).astype(float)
+        scores = sum(weights[name] * component for name, component in components.items())
+        ranked = np.argsort(-scores, kind="stable")[:top or None]
+        for index in ranked:
+            if scores[index] < min_score:
+                break
+            reasons = [name for name, component in components.items() if component[index] >= 0.5]
+            if travel[index]:
+                reasons[reasons.index("impossible travel")] = f"impossible travel ({travel[index]})"
+            ip = ips[index]
+            self.scores[ip] = {"score": round(float(scores[index]), 2), "reasons": "; ".join(reasons)}
+            self.suspicious_ips.append(ip)
+        return self.suspicious_ips
 
     def return_sus_ips(self):
-        return self.median_out_ips
+        return self.suspicious_ips
 
     def return_ip_info(self, ip):
         if self.ips_dict.get(ip) != None:
             return self.ips_dict[ip]
-
@@ -1,8 +1,19 @@
+import argparse
 import configparser
-from graph import Graph
+import csv
+import html
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from graph import Graph, create_user_client, create_graph_transport, create_geo_transport
+from cache import EntityCache
 from ips import IPS
-import plotly.express as px
-import pandas as pd
+from orchestrator import Orchestrator
+from sweep import Sweep
+from export import load_export, restore_report
 
 
 def main():
@@ -18,18 +29,37 @@ U |  _"\ u \| ___"|/U|  _"\ u  \/"_ \/U |  _"\ u  |_ " _|  |"|     \ \ / /
  know your user.
 ''')
 
+    parser = argparse.ArgumentParser(description="EntraID user activity report tool.")
+    parser.add_argument("--no-cache", action="store_true", help="ignore cached Graph responses and fetch everything again")
+    parser.add_argument("--batch", help="CSV or JSON file with user, start, end and optional output for each report")
+    parser.add_argument("--output-dir", default=".", help="directory for batch reports and the summary index")
+    parser.add_argument("--workers", type=int, default=0, help="reports generated in parallel in batch mode")
+    parser.add_argument("--render", metavar="EXPORT_DIR", help="create the report again from datasets exported by an earlier run, without Graph")
+    parser.add_argument("--sweep", nargs=2, metavar=("START", "END"), help="summarize the sign-ins and audit events of every user in the window")
+    args = parser.parse_args()
+
     # Load settings
     config = configparser.ConfigParser()
     config.read(['config.cfg', 'config.dev.cfg'])
     azure_settings = config['azure']
 
+    if args.batch:
+        run_batch(azure_settings, args)
+        return
+    if args.sweep:
+        run_sweep(azure_settings, args)
+        return
+    if args.render:
+        render_export(azure_settings, args)
+        return
+
     sus_user = input("Enter UserPrincipalName: ")
     start_date = input("Enter start date: ")
     end_date = input("Enter end date: ")
     output_file = input("Enter output path: ")
     if output_file == "":
         output_file = "report.html"
-    graph: Graph = Graph(azure_settings, sus_user, start_date, end_date, output_file)
+    graph: Graph = Graph(azure_settings, sus_user, start_date, end_date, output_file, use_cache=not args.no_cache)
     greet_user(graph)
     create_final_report(graph)
 
@@ -46,43 +76,187 @@ def call_audit_initiated(graph: Graph):
     audit = graph.get_audit_initiated()
     if audit == "This user has not performed any action.":
         return audit
-    graph.create_graph_initiated()
+    with graph.tracer.span("chart"):
+        return graph.create_graph_initiated()
 
 def call_audit_target(graph: Graph):
     audit = graph.get_audit_target()
     if audit == "No operations have been performed on this user.":
         return audit
-    graph.create_graph_target()
+    with graph.tracer.span("chart"):
+        return graph.create_graph_target()
 
-def call_signin(graph: Graph):
-    audit_fail = graph.get_audit_signIn_failed()
-    audit_success = graph.get_audit_signIn_success()
+def call_signin(graph: Graph, audit_fail, audit_success):
     if audit_fail == "No logs" and audit_success == "No logs":
         return "This user has not logged in."
-    graph.create_graph_signin()
+    with graph.tracer.span("chart"):
+        return graph.create_graph_signin()
 
 def get_sus_ips(graph: Graph):
     ips_dict = graph.get_ips()
-    ips: IPS = IPS(ips_dict)
-    ips.analyze_ips()
-    sus_ips = ips.median_out_ips
+    ips: IPS = IPS(ips_dict, graph.audit_signin)
+    # only the highest scoring IPs are geolocated and shown in the report
+    ips.analyze_ips(graph.ip_top, graph.ip_min_score)
+    sus_ips = ips.return_sus_ips()
     sus_ips_info = {}
     for ip in sus_ips:
-        info = ips.return_ip_info(ip)
+        info = dict(ips.return_ip_info(ip), **ips.scores[ip])
         sus_ips_info[ip] = info
     return sus_ips_info
     
+def get_sus_ips_loc(graph: Graph):
+    ips = get_sus_ips(graph)
+    return graph.get_ips_loc(ips)
+
 def get_sigin_errors(graph:Graph):
     errors_list = graph.bad_sigin_errors()
     return errors_list
 
+def create_report_orchestrator(graph:Graph):
+    orchestrator = Orchestrator(graph.max_concurrency, tracer=graph.tracer)
+    orchestrator.add_task("initiated", lambda: call_audit_initiated(graph))
+    orchestrator.add_task("target", lambda: call_audit_target(graph))
+    orchestrator.add_task("signin_failed", graph.get_audit_signIn_failed)
+    orchestrator.add_task("signin_success", graph.get_audit_signIn_success)
+    orchestrator.add_task("signin", lambda audit_fail, audit_success: call_signin(graph, audit_fail, audit_success), depends_on=["signin_failed", "signin_success"])
+    orchestrator.add_task("ips", lambda *_: get_sus_ips_loc(graph), depends_on=["signin_failed", "signin_success"])
+    orchestrator.add_task("signin_errors", lambda *_: get_sigin_errors(graph), depends_on=["signin_failed", "signin_success"])
+    graph.add_report_tasks(orchestrator)
+    return orchestrator
+
 def create_final_report(graph:Graph):
-    initiated = call_audit_initiated(graph)
-    target = call_audit_target(graph)
-    signin = call_signin(graph)
-    ips = get_sus_ips(graph)
-    signin_errors = get_sigin_errors(graph)
-    graph.generate_report(initiated, target, signin, ips,signin_errors)
-    print("Your report is ready!")
+    tracer = graph.tracer
+    with tracer.span("report"):
+        with tracer.span("load_checkpoint"):
+            graph.load_checkpoint()
+        with tracer.span("fetch"):
+            results = create_report_orchestrator(graph).run()
+        if graph.resumed_pages:
+            print(f"Resumed {graph.resumed_pages} pages downloaded by an earlier run")
+        with tracer.span("save_checkpoint"):
+            graph.save_checkpoint()
+        graph.generate_report(results)
+        export_dir = graph.export_datasets(results)
+    print(f"Your report is ready! ({graph.out_file})")
+    if export_dir:
+        print(f"Datasets: {export_dir}")
+    trace_file = graph.write_trace()
+    if trace_file:
+        print(f"Run trace: {trace_file}")
+    cache_stats = graph.cache.stats()
+    print(f"Cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
+    transport_stats = graph.transport.stats()
+    print(f"Graph: {transport_stats['requests']} requests, {transport_stats['throttled']} throttled, {transport_stats['retries']} retries, "
+          f"{transport_stats['waited']:.1f}s waited, concurrency {transport_stats['concurrency']}")
+
+def load_batch(path, output_dir):
+    if path.lower().endswith('.json'):
+        with open(path, encoding='utf8') as batch_file:
+            entries = json.load(batch_file)
+    else:
+        with open(path, newline='', encoding='utf8') as batch_file:
+            entries = list(csv.DictReader(batch_file))
+    jobs = []
+    for entry in entries:
+        user = entry['user'].strip()
+        output_file = (entry.get('output') or '').strip()
+        if output_file == "":
+            output_file = os.path.join(output_dir, "report_" + re.sub(r'[^A-Za-z0-9._-]', '_', user) + ".html")
+        jobs.append({"user": user, "start": entry['start'].strip(), "end": entry['end'].strip(), "output": output_file})
+    return jobs
+
+def run_batch_job(create_graph, job):
+    started = time.time()
+    try:
+        # each report's Graph is built when its job starts and dropped when it ends
+        create_final_report(create_graph(job))
+        status = "done"
+    except Exception as error:
+        status = f"failed: {error}"
+        print(f"Report for {job['user']} failed: {error}")
+    job = dict(job)
+    job["status"] = status
+    job["seconds"] = round(time.time() - started, 1)
+    return job
+
+def write_batch_index(results, output_dir):
+    rows = ""
+    for result in results:
+        link = html.escape(os.path.relpath(result["output"], output_dir))
+        cells = "".join(f"<td>{html.escape(str(result[field]))}</td>" for field in ("user", "start", "end", "status", "seconds"))
+        rows += f"<tr>{cells}<td><a href=\"{link}\">{link}</a></td></tr>\n"
+    html_string = '''<!doctype html>
+<html>
+    <head>
+        <meta charset="UTF-8">
+        <title>Reports</title>
+        <style>
+            body { margin:0 100; background: #e6f0ff; font: 15px Arial, sans-serif; color: black; }
+            td, th { padding: 4px 12px; text-align: left; }
+        </style>
+    </head>
+    <body>
+        <h2>Reports</h2>
+        <table>
+        <tr><th>User</th><th>Start</th><th>End</th><th>Status</th><th>Seconds</th><th>Report</th></tr>
+''' + rows + '''        </table>
+    </body>
+</html>'''
+    index_file = os.path.join(output_dir, "index.html")
+    with open(index_file, 'w', encoding='utf8') as fw:
+        fw.write(html_string)
+    with open(os.path.join(output_dir, "index.json"), 'w', encoding='utf8') as fw:
+        json.dump(results, fw, indent=2)
+    return index_file
+
+def run_batch(azure_settings, args):
+    os.makedirs(args.output_dir, exist_ok=True)
+    jobs = load_batch(args.batch, args.output_dir)
+    if len(jobs) == 0:
+        print("The batch file has no users.")
+        return
+    # one credential, HTTP session, request budget, geolocation database and SQLite caches shared by every report
+    credential, client = create_user_client(azure_settings)
+    transport = create_graph_transport(azure_settings, client)
+    geo_transport = create_geo_transport(azure_settings)
+    shared_cache = EntityCache()
+
+    def create_graph(job):
+        return Graph(azure_settings, job["user"], job["start"], job["end"], job["output"], use_cache=not args.no_cache, credential=credential,
+                     client=client, transport=transport, geo_transport=geo_transport, shared_cache=shared_cache)
+
+    greet_user(create_graph(jobs[0]))
+    workers = args.workers or azure_settings.getint('batchWorkers', fallback=4)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(partial(run_batch_job, create_graph), jobs))
+    index_file = write_batch_index(results, args.output_dir)
+    failed = sum(1 for result in results if result["status"] != "done")
+    print(f"{len(results) - failed} of {len(results)} reports are ready, summary: {index_file}")
+
+def render_export(azure_settings, args):
+    os.makedirs(args.output_dir, exist_ok=True)
+    meta, _ = load_export(args.render)
+    output_file = os.path.join(args.output_dir, "report.html")
+    window_start, window_end = meta["window"]
+    graph: Graph = Graph(azure_settings, meta["user"], window_start, window_end, output_file, use_cache=False, offline=True)
+    graph.generate_report(restore_report(graph, args.render))
+    print(f"Your report is ready! ({output_file})")
+
+def run_sweep(azure_settings, args):
+    os.makedirs(args.output_dir, exist_ok=True)
+    start_date, end_date = args.sweep
+    html_file = os.path.join(args.output_dir, "sweep.html")
+    # the tenant's logs are paged once without a user filter and split per user locally
+    graph: Graph = Graph(azure_settings, "", start_date, end_date, html_file, use_cache=False)
+    greet_user(graph)
+    sweep = Sweep(graph, azure_settings.getint('sweepPartitions', fallback=16), spray_min_users=azure_settings.getint('sprayMinUsers', fallback=5))
+    with graph.tracer.span("sweep"):
+        users = sweep.run()
+    sweep.write_report(users, html_file, os.path.join(args.output_dir, "sweep.json"))
+    print(f"Sweep of {len(users)} users is ready! ({html_file})")
+    trace_file = graph.write_trace()
+    if trace_file:
+        print(f"Run trace: {trace_file}")
 
-main()
+if __name__ == "__main__":
+    main()
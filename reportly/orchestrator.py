@@ -0,0 +1,81 @@
+# orchestrator.py>
+
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+
+class Orchestrator:
+
+    def __init__(self, max_workers=4, tracer=None):
+        self.max_workers = max(1, int(max_workers))
+        self.tracer = tracer
+        self.tasks = {}
+        self.results = {}
+        self.timings = {}
+
+    def add_task(self, name, func, depends_on=()):
+        if name in self.tasks:
+            raise ValueError(f"Task {name} is already registered.")
+        self.tasks[name] = (func, tuple(depends_on))
+
+    def check_dependencies(self):
+        for name, (func, depends_on) in self.tasks.items():
+            for dependency in depends_on:
+                if dependency not in self.tasks:
+                    raise ValueError(f"Task {name} depends on unknown task {dependency}.")
+        visited = {}
+
+        def visit(name):
+            state = visited.get(name)
+            if state == "done":
+                return
+            if state == "visiting":
+                raise ValueError(f"Dependency cycle detected at task {name}.")
+            visited[name] = "visiting"
+            for dependency in self.tasks[name][1]:
+                visit(dependency)
+            visited[name] = "done"
+
+        for name in self.tasks:
+            visit(name)
+
+    def run_task(self, name, func, *args):
+        started = time.perf_counter()
+        try:
+            if self.tracer is None:
+                return func(*args)
+            with self.tracer.span(name):
+                return func(*args)
+        finally:
+            self.timings[name] = time.perf_counter() - started
+
+    def ready_tasks(self, pending):
+        ready = []
+        for name in pending:
+            depends_on = self.tasks[name][1]
+            if all(dependency in self.results for dependency in depends_on):
+                ready.append(name)
+        return ready
+
+    def run(self):
+        self.check_dependencies()
+        pending = set(self.tasks)
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                for name in self.ready_tasks(pending):
+                    func, depends_on = self.tasks[name]
+                    args = [self.results[dependency] for dependency in depends_on]
+                    run_task = self.tracer.wrap(self.run_task) if self.tracer else self.run_task
+                    running[executor.submit(run_task, name, func, *args)] = name
+                    pending.discard(name)
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    error = future.exception()
+                    if error is not None:
+                        for other in running:
+                            other.cancel()
+                        raise error
+                    self.results[name] = future.result()
+        return self.results
@@ -0,0 +1,57 @@
+# resume.py>
+
+import json
+import os
+import threading
+
+
+class ResumeLog:
+    # one JSON line per completed page: the query, the link to its next page and the rows parsed from the page,
+    # a time shard that was split also lists the bounds of the shards that replace the rest of it
+
+    def __init__(self, path, run, resume=True):
+        self.path = path
+        self.run = run
+        self.lock = threading.Lock()
+        self.queries = self.load() if resume else {}
+        if not self.queries:
+            with open(self.path, 'w', encoding='utf8') as log_file:
+                log_file.write(json.dumps(self.run) + "\n")
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return {}
+        queries = {}
+        with open(self.path, 'rb+') as log_file:
+            header = log_file.readline()
+            if not header.endswith(b"\n") or json.loads(header) != self.run:
+                return {}
+            complete = log_file.tell()
+            for line in log_file:
+                if not line.endswith(b"\n"):
+                    break
+                entry = json.loads(line)
+                query = queries.setdefault((entry["query"], entry["url"]), {"next": None, "pages": [], "shards": None})
+                query["next"] = entry["next"]
+                query["pages"].append(entry["rows"])
+                query["shards"] = entry.get("shards")
+                complete += len(line)
+            # a line cut off when the run died is dropped, its page is fetched again
+            log_file.truncate(complete)
+        return queries
+
+    def resume(self, query, url):
+        return self.queries.get((query, url))
+
+    def record(self, query, url, next_link, rows, shards=None):
+        entry = {"query": query, "url": url, "next": next_link, "rows": rows}
+        if shards:
+            entry["shards"] = shards
+        line = json.dumps(entry) + "\n"
+        with self.lock, open(self.path, 'a', encoding='utf8') as log_file:
+            log_file.write(line)
+
+    def remove(self):
+        with self.lock:
+            if os.path.exists(self.path):
+                os.remove(self.path)
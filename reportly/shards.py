@@ -0,0 +1,185 @@
+# shards.py>
+
+import datetime
+import math
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Shard:
+
+    def __init__(self, start, end, url):
+        self.start = start
+        self.end = end
+        self.url = url
+        # (records, next link, split bounds) per page, then None when the shard is done
+        self.pages = queue.Queue()
+        self.children = []
+
+    def bounds(self):
+        return [self.start.isoformat(), self.end.isoformat()]
+
+
+class ShardedFetch:
+    # a query's window is fetched as time shards with their own $filter, a shard whose first page shows more
+    # events than shard_pages pages can hold is split, and the pages come out in the order one request chain gives
+
+    def __init__(self, graph, url_for, time_field, start, end, workers=4, shard_pages=4, resumed=None, read_ahead=8):
+        self.graph = graph
+        self.url_for = url_for
+        self.time_field = time_field
+        self.start = start
+        self.end = end
+        self.workers = max(1, workers)
+        self.shard_pages = shard_pages
+        self.max_split = 2 * self.workers
+        self.resumed = resumed
+        self.replayed = []
+        self.executor = None
+        self.stopped = threading.Event()
+        # pages fetched but not read yet, a shard that would go past read_ahead hands its thread back and is parked
+        # until the reader frees a page; the shard being read may always fetch the page the reader waits for
+        self.read_ahead = read_ahead
+        self.ahead = 0
+        self.parked = []
+        self.current = None
+        self.lock = threading.Lock()
+
+    def shard(self, start, end):
+        return Shard(start, end, self.url_for(start, end))
+
+    def start_shard(self, shard):
+        entry = self.resumed(shard.url) if self.resumed else None
+        if entry is None:
+            self.submit(shard, shard.url, True)
+            return
+        self.replayed.extend(entry["pages"])
+        if entry["next"]:
+            self.submit(shard, entry["next"], False)
+            return
+        shard.children = [self.shard(datetime.datetime.fromisoformat(start), datetime.datetime.fromisoformat(end)) for start, end in entry["shards"] or []]
+        for child in shard.children:
+            self.start_shard(child)
+        shard.pages.put(None)
+
+    def submit(self, shard, url, split, reserved=False):
+        # the caller's spans are carried to the worker, so a query's span counts the requests of all its shards
+        self.executor.submit(self.graph.tracer.wrap(self.fetch), shard, url, split, reserved)
+
+    def can_fetch(self, shard):
+        return not self.read_ahead or self.ahead < self.read_ahead or (shard is self.current and shard.pages.empty())
+
+    def reserve(self, shard, url, split):
+        with self.lock:
+            if self.can_fetch(shard):
+                self.ahead += 1
+                return True
+            self.parked.append((shard, url, split))
+            return False
+
+    def resume_parked(self):
+        # called with the lock held, the shard being read goes first
+        parked, self.parked = sorted(self.parked, key=lambda entry: entry[0] is not self.current), []
+        for shard, url, split in parked:
+            if self.can_fetch(shard):
+                self.ahead += 1
+                self.submit(shard, url, split, reserved=True)
+            else:
+                self.parked.append((shard, url, split))
+
+    def read(self, shard):
+        with self.lock:
+            self.current = shard
+            self.resume_parked()
+
+    def release(self):
+        with self.lock:
+            self.ahead -= 1
+            self.resume_parked()
+
+    def fetch(self, shard, url, split, reserved=False):
+        done = True
+        try:
+            while url and not self.stopped.is_set():
+                if not reserved and not self.reserve(shard, url, split):
+                    done = False
+                    return
+                reserved = False
+                records, next_link = self.graph.read_page(url)
+                if split and next_link:
+                    split = False
+                    kept, children = self.split(shard, records)
+                    if children:
+                        shard.children = children
+                        shard.pages.put((kept, None, [child.bounds() for child in children]))
+                        for child in children:
+                            self.start_shard(child)
+                        return
+                shard.pages.put((records, next_link, None))
+                url = next_link
+        except Exception as error:
+            shard.pages.put(error)
+        finally:
+            if done:
+                shard.pages.put(None)
+
+    def split(self, shard, records):
+        times = [self.graph.parse_event_time(record[self.time_field]) for record in records]
+        one_second = datetime.timedelta(seconds=1)
+        # a page that starts with the newest events holds every event after its oldest second, one that starts
+        # with the oldest holds every event before its newest second, the rest of the shard is cut at that second
+        if all(newer >= older for newer, older in zip(times, times[1:])):
+            cut = times[-1] + one_second
+            kept = [record for record, created in zip(records, times) if created >= cut]
+            rest_start, rest_end = shard.start, cut
+        elif all(older <= newer for older, newer in zip(times, times[1:])):
+            cut = times[-1]
+            kept = [record for record, created in zip(records, times) if created < cut]
+            rest_start, rest_end = cut, shard.end
+        else:
+            return records, None
+        if not kept:
+            return records, None
+        density = len(records) / ((abs(times[0] - times[-1]) + one_second) / one_second)
+        expected_pages = density * ((rest_end - rest_start) / one_second) / len(records)
+        if expected_pages <= self.shard_pages:
+            return records, None
+        count = min(self.max_split, math.ceil(expected_pages / self.shard_pages))
+        seconds = int((rest_end - rest_start) / one_second)
+        bounds = sorted({rest_start + one_second * (seconds * index // count) for index in range(count)} | {rest_end})
+        children = [self.shard(start, end) for start, end in zip(bounds, bounds[1:])]
+        if times[0] > times[-1]:
+            children.reverse()
+        return kept, children
+
+    def emit(self, shard):
+        self.read(shard)
+        while True:
+            page = shard.pages.get()
+            if page is None:
+                break
+            if isinstance(page, Exception):
+                raise page
+            yield shard, page
+        for child in shard.children:
+            yield from self.emit(child)
+
+    def pages(self, on_page=None, on_resume=None):
+        self.executor = ThreadPoolExecutor(self.workers)
+        try:
+            root = self.shard(self.start, self.end)
+            self.start_shard(root)
+            # the rows of the pages an earlier run finished, the shards that still have pages are already fetching
+            for rows in self.replayed:
+                if on_resume is not None:
+                    on_resume(rows)
+            for shard, (records, next_link, bounds) in self.emit(root):
+                yield records
+                # the records are parsed by now, so the page can be marked done
+                if on_page is not None:
+                    on_page(shard.url, next_link, bounds)
+                self.release()
+        finally:
+            self.stopped.set()
+            self.executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,211 @@
+# sweep.py>
+
+import json
+import threading
+import zlib
+from events import BAD_SIGNIN_CODES
+from ips import IPS
+from orchestrator import Orchestrator
+from tables import render_table, TABLE_ASSETS
+
+
+class Partition:
+
+    def __init__(self):
+        self.users = {}
+        self.lock = threading.Lock()
+
+    def user(self, upn):
+        summary = self.users.get(upn)
+        if summary is None:
+            summary = {"signins": 0, "failed": 0, "ips": {}, "errors": {}, "bad_errors": [], "bad_count": 0, "first_seen": None, "last_seen": None,
+                       "initiated": 0, "targeted": 0, "activities": {}}
+            self.users[upn] = summary
+        return summary
+
+
+class Sweep:
+
+    def __init__(self, graph, partitions=16, bad_errors_limit=50, spray_min_users=5, top_ips=3):
+        self.graph = graph
+        self.partitions = [Partition() for _ in range(max(1, partitions))]
+        self.bad_errors_limit = bad_errors_limit
+        self.spray_min_users = spray_min_users
+        self.top_ips = top_ips
+        self.failed_users = {}
+        self.lock = threading.Lock()
+
+    def partition_index(self, upn):
+        # crc32 rather than hash() so a user lands in the same partition on every run
+        return zlib.crc32(upn.encode()) % len(self.partitions)
+
+    def by_partition(self, users):
+        partitioned = {}
+        for upn in users:
+            partitioned.setdefault(self.partition_index(upn), []).append(upn)
+        return [(self.partitions[index], upns) for index, upns in partitioned.items()]
+
+    def add_signin_page(self, page):
+        import pandas as pd
+        graph = self.graph
+        frame = pd.json_normalize(page, max_level=2)
+        frame = frame[graph.window_mask(frame['createdDateTime']) & frame['userPrincipalName'].notna()]
+        if len(frame) == 0:
+            return
+        frame = frame.assign(user=frame['userPrincipalName'].str.lower(), code=frame['status.errorCode'].fillna(0).astype('int64'))
+        frame = frame.assign(failed=frame['code'] != 0)
+        per_user = frame.groupby('user', sort=False).agg(signins=('id', 'size'), failed=('failed', 'sum'),
+                                                       first_seen=('createdDateTime', 'min'), last_seen=('createdDateTime', 'max'))
+        per_ip = frame.groupby(['user', 'ipAddress'], sort=False, dropna=False).agg(count=('id', 'size'), app_used=('clientAppUsed', set),
+                                                                                    resource=('resourceDisplayName', set))
+        errors = frame[frame['failed']].groupby(['user', 'code'], sort=False).size()
+        bad = frame[frame['code'].isin(BAD_SIGNIN_CODES)]
+        bad_errors = {}
+        for user, created, resource, ip, app_used, code, reason, details in zip(bad['user'], bad['createdDateTime'], bad['resourceDisplayName'], bad['ipAddress'],
+                                                                              bad['clientAppUsed'], bad['code'], graph.page_column(bad, 'status.failureReason'),
+                                                                              graph.page_column(bad, 'status.additionalDetails')):
+            bad_errors.setdefault(user, []).append({"created": created, "resource": resource, "ip": ip, "app_used": app_used, "code": int(code), "reason": reason, "details": details})
+        ips_by_user = {}
+        for (user, ip), count, app_used, resource in zip(per_ip.index, per_ip['count'].tolist(), per_ip['app_used'], per_ip['resource']):
+            ips_by_user.setdefault(user, []).append((ip, count, app_used, resource))
+        errors_by_user = {}
+        for (user, code), count in zip(errors.index, errors.tolist()):
+            errors_by_user.setdefault(user, []).append((int(code), count))
+
+        user_rows = dict(zip(per_user.index, zip(per_user['signins'].tolist(), per_user['failed'].tolist(), per_user['first_seen'], per_user['last_seen'])))
+        for partition, users in self.by_partition(user_rows):
+            with partition.lock:
+                for user in users:
+                    summary = partition.user(user)
+                    signins, failed, first_seen, last_seen = user_rows[user]
+                    summary["signins"] += signins
+                    summary["failed"] += failed
+                    summary["first_seen"] = min(filter(None, [summary["first_seen"], first_seen]))
+                    summary["last_seen"] = max(filter(None, [summary["last_seen"], last_seen]))
+                    for ip, count, app_used, resource in ips_by_user.get(user, []):
+                        ip_object = summary["ips"].setdefault(ip, {"count": 0, "app_used": set(), "resource": set()})
+                        ip_object["count"] += count
+                        ip_object["app_used"].update(app_used)
+                        ip_object["resource"].update(resource)
+                    for code, count in errors_by_user.get(user, []):
+                        summary["errors"][code] = summary["errors"].get(code, 0) + count
+                    # every suspicious failure is counted, only the first bad_errors_limit are kept as examples
+                    user_bad_errors = bad_errors.get(user, [])
+                    summary["bad_count"] += len(user_bad_errors)
+                    room = self.bad_errors_limit - len(summary["bad_errors"])
+                    summary["bad_errors"].extend(user_bad_errors[:max(0, room)])
+
+        failed = frame[frame['failed']].groupby('ipAddress', sort=False)['user'].agg(set)
+        with self.lock:
+            for ip, users in zip(failed.index, failed.tolist()):
+                self.failed_users.setdefault(ip, set()).update(users)
+
+    def add_audit_page(self, page):
+        import pandas as pd
+        graph = self.graph
+        frame = pd.DataFrame.from_records(page, columns=['activityDisplayName', 'activityDateTime', 'targetResources', 'initiatedBy'])
+        frame = frame[graph.window_mask(frame['activityDateTime'])]
+        if len(frame) == 0:
+            return
+        initiators = [((initiated_by or {}).get('user') or {}).get('userPrincipalName') for initiated_by in frame['initiatedBy']]
+        initiated = pd.Series([upn.lower() if upn else None for upn in initiators]).value_counts()
+        targets = []
+        for activity, target_resources in zip(frame['activityDisplayName'], frame['targetResources']):
+            for target in target_resources or []:
+                if target.get('type') == "User" and target.get('userPrincipalName'):
+                    targets.append((target['userPrincipalName'].lower(), activity))
+        targeted = pd.DataFrame(targets, columns=['user', 'activity']).groupby(['user', 'activity']).size()
+
+        activities_by_user = {}
+        for (user, activity), count in zip(targeted.index, targeted.tolist()):
+            activities_by_user.setdefault(user, []).append((activity, count))
+        users = set(initiated.index) | set(activities_by_user)
+        for partition, partition_users in self.by_partition(users):
+            with partition.lock:
+                for user in partition_users:
+                    summary = partition.user(user)
+                    summary["initiated"] += int(initiated.get(user, 0))
+                    for activity, count in activities_by_user.get(user, []):
+                        summary["targeted"] += count
+                        summary["activities"][activity] = summary["activities"].get(activity, 0) + count
+
+    def sweep_signins(self):
+        graph = self.graph
+        request_url = f"/auditLogs/signIns?$filter={graph.date_filter('createdDateTime')}"
+        for page in graph.iterate_pages(request_url, graph.page_size, graph.record_limit):
+            if len(page) > 0:
+                self.add_signin_page(page)
+
+    def sweep_audits(self):
+        graph = self.graph
+        request_url = f"/auditLogs/directoryAudits?$filter={graph.date_filter('activityDateTime')}"
+        for page in graph.iterate_pages(request_url, graph.page_size, graph.record_limit):
+            if len(page) > 0:
+                self.add_audit_page(page)
+
+    def run(self):
+        orchestrator = Orchestrator(2, tracer=self.graph.tracer)
+        orchestrator.add_task("signins", self.sweep_signins)
+        orchestrator.add_task("audits", self.sweep_audits)
+        orchestrator.run()
+        return self.summaries()
+
+    def summaries(self):
+        users = {}
+        for partition in self.partitions:
+            with partition.lock:
+                users.update(partition.users)
+        for summary in users.values():
+            ips = IPS(summary["ips"])
+            ips.analyze_ips(self.top_ips)
+            summary["suspicious_ips"] = {ip: ips.scores[ip] for ip in ips.return_sus_ips()}
+        return dict(sorted(users.items(), key=lambda item: (-item[1]["failed"], item[0])))
+
+    def spray_sources(self):
+        with self.lock:
+            sources = {ip: users for ip, users in self.failed_users.items() if len(users) >= self.spray_min_users}
+        return dict(sorted(sources.items(), key=lambda item: -len(item[1])))
+
+    def write_report(self, users, html_file, json_file):
+        rows = []
+        for upn, summary in users.items():
+            rows.append({
+                "User": upn,
+                "Sign-ins": summary["signins"],
+                "Failed": summary["failed"],
+                "Suspicious failures": summary["bad_count"],
+                "Error codes": [f"{code} x{count}" for code, count in summary["errors"].items()],
+                "IPs": len(summary["ips"]),
+                "Top IPs": [f"{ip} ({score['score']})" for ip, score in summary["suspicious_ips"].items()],
+                "Initiated": summary["initiated"],
+                "Targeted": summary["targeted"],
+                "Activities": [f"{activity} x{count}" for activity, count in summary["activities"].items()],
+                "First sign-in": summary["first_seen"],
+                "Last sign-in": summary["last_seen"],
+            })
+        spray = [{"IP": ip, "Users": len(upns), "Failed users": sorted(upns)} for ip, upns in self.spray_sources().items()]
+        graph = self.graph
+        window = f"{graph.window_start.isoformat()} - {graph.window_end.isoformat()}"
+        html_string = '''<!doctype html>
+<html>
+    <head>
+        <meta charset="UTF-8">
+        <title>Tenant sweep</title>
+        ''' + TABLE_ASSETS + '''
+        <style>
+            body { margin:0 100; background: #e6f0ff; font: 15px Arial, sans-serif; color: black; }
+        </style>
+    </head>
+    <body>
+        <h2>Tenant sweep ''' + window + '''</h2>
+        <h3>IPs with failed sign-ins against ''' + str(self.spray_min_users) + ''' or more users</h3>
+        ''' + (render_table(spray) if spray else "No spray sources.") + '''
+        <h3>Users</h3>
+        ''' + render_table(rows) + '''
+    </body>
+</html>'''
+        with open(html_file, 'w', encoding='utf8') as fw:
+            fw.write(html_string)
+        with open(json_file, 'w', encoding='utf8') as fw:
+            json.dump({"window": [graph.window_start.isoformat(), graph.window_end.isoformat()], "users": users,
+                       "spray_sources": {ip: sorted(upns) for ip, upns in self.spray_sources().items()}}, fw, indent=1, default=lambda value: sorted(value, key=str))
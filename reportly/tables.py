@@ -0,0 +1,123 @@
+# tables.py>
+
+import itertools
+import json
+import math
+
+
+TABLE_ASSETS = '''
+<style>
+    .rtable-controls { margin: 6px 0; }
+    .rtable table { border-collapse: collapse; width: 100%; }
+    .rtable th { cursor: pointer; text-align: left; background-color: #99c2ff; }
+    .rtable th, .rtable td { padding: 4px 8px; border-bottom: 1px solid #80b3ff; white-space: pre-line; }
+</style>
+<script type="text/javascript">
+document.addEventListener("DOMContentLoaded", function() {
+    var containers = document.getElementsByClassName("rtable");
+    for (var i = 0; i < containers.length; i++) {
+        initTable(containers[i]);
+    }
+    function initTable(container) {
+        var data = JSON.parse(container.querySelector("script").textContent);
+        var state = {page: 0, pageSize: 25, sortColumn: -1, ascending: true, filter: "", rows: data.rows};
+        var controls = document.createElement("div");
+        controls.className = "rtable-controls";
+        var filter = document.createElement("input");
+        filter.placeholder = "Filter";
+        var previous = document.createElement("button");
+        previous.textContent = "<";
+        var next = document.createElement("button");
+        next.textContent = ">";
+        var position = document.createElement("span");
+        controls.appendChild(filter);
+        controls.appendChild(previous);
+        controls.appendChild(position);
+        controls.appendChild(next);
+        var table = document.createElement("table");
+        var head = document.createElement("tr");
+        data.columns.forEach(function(column, index) {
+            var th = document.createElement("th");
+            th.textContent = column;
+            th.addEventListener("click", function() {
+                state.ascending = state.sortColumn === index ? !state.ascending : true;
+                state.sortColumn = index;
+                update();
+            });
+            head.appendChild(th);
+        });
+        var thead = document.createElement("thead");
+        thead.appendChild(head);
+        var tbody = document.createElement("tbody");
+        table.appendChild(thead);
+        table.appendChild(tbody);
+        container.appendChild(controls);
+        container.appendChild(table);
+        filter.addEventListener("input", function() { state.filter = filter.value.toLowerCase(); state.page = 0; update(); });
+        previous.addEventListener("click", function() { state.page = Math.max(0, state.page - 1); render(); });
+        next.addEventListener("click", function() { state.page = Math.min(pages() - 1, state.page + 1); render(); });
+        function pages() { return Math.max(1, Math.ceil(state.rows.length / state.pageSize)); }
+        function update() {
+            var rows = data.rows;
+            if (state.filter) {
+                rows = rows.filter(function(row) { return row.join(" ").toLowerCase().indexOf(state.filter) !== -1; });
+            }
+            if (state.sortColumn >= 0) {
+                var column = state.sortColumn, direction = state.ascending ? 1 : -1;
+                rows = rows.slice().sort(function(a, b) {
+                    var x = a[column], y = b[column];
+                    if (typeof x === "number" && typeof y === "number") { return (x - y) * direction; }
+                    return String(x).localeCompare(String(y)) * direction;
+                });
+            }
+            state.rows = rows;
+            state.page = Math.min(state.page, pages() - 1);
+            render();
+        }
+        function render() {
+            tbody.innerHTML = "";
+            var start = state.page * state.pageSize;
+            state.rows.slice(start, start + state.pageSize).forEach(function(row) {
+                var tr = document.createElement("tr");
+                row.forEach(function(value) {
+                    var td = document.createElement("td");
+                    td.textContent = value;
+                    tr.appendChild(td);
+                });
+                tbody.appendChild(tr);
+            });
+            var shown = Math.min(start + state.pageSize, state.rows.length);
+            position.textContent = " " + (state.rows.length ? start + 1 : 0) + "-" + shown + " of " + state.rows.length + " ";
+        }
+        render();
+    }
+});
+</script>
+'''
+
+
+def table_value(value):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return " "
+    if isinstance(value, (set, frozenset, list, tuple)):
+        return "; ".join(sorted(str(item) for item in value))
+    if isinstance(value, bool):
+        return str(value)
+    if isinstance(value, (int, float, str)):
+        return value
+    return str(value)
+
+
+def render_table(records, columns=None):
+    records = list(records)
+    if columns is None:
+        columns = list(dict.fromkeys(itertools.chain.from_iterable(records)))
+    rows = [[table_value(record.get(column)) for column in columns] for record in records]
+    data = json.dumps({"columns": columns, "rows": rows}, separators=(",", ":"), default=str).replace("</", "<\\/")
+    return f'<div class="rtable"><script type="application/json">{data}</script></div>'
+
+
+def render_columns(columns_dict):
+    columns = list(columns_dict)
+    records = [dict(zip(columns, values)) for values in zip(*columns_dict.values())]
+    return render_table(records, columns)
@@ -0,0 +1,111 @@
+# tracing.py>
+
+import datetime
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+
+COUNTERS = ["http_calls", "bytes", "retries", "throttled", "cache_hits", "cache_misses", "rows_parsed", "rows_kept"]
+
+_local = threading.local()
+
+
+def active_spans():
+    if not hasattr(_local, "spans"):
+        _local.spans = []
+    return _local.spans
+
+
+def count(name, value=1):
+    # every open span of the calling thread gets the value, so a span's counters include its children
+    for span in active_spans():
+        span.add(name, value)
+
+
+class Span:
+
+    def __init__(self, span_id, name, parent_id, thread, started):
+        self.span_id = span_id
+        self.name = name
+        self.parent_id = parent_id
+        self.thread = thread
+        self.started = started
+        self.ended = None
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def add(self, name, value):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+
+class Tracer:
+
+    def __init__(self):
+        self.spans = []
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.started_at = datetime.datetime.now(datetime.timezone.utc)
+
+    @contextmanager
+    def span(self, name):
+        spans = active_spans()
+        parent = spans[-1] if spans else None
+        with self.lock:
+            span = Span(len(self.spans) + 1, name, parent.span_id if parent else None, threading.current_thread().name, time.perf_counter())
+            self.spans.append(span)
+        spans.append(span)
+        try:
+            yield span
+        finally:
+            span.ended = time.perf_counter()
+            spans.remove(span)
+
+    def wrap(self, func):
+        # worker threads start without spans, the caller's open spans are carried over so their counters add up
+        parent_spans = list(active_spans())
+
+        def run(*args, **kwargs):
+            spans = active_spans()
+            depth = len(spans)
+            spans.extend(parent_spans)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                del spans[depth:]
+        return run
+
+    def to_dict(self):
+        now = time.perf_counter()
+        with self.lock:
+            spans = list(self.spans)
+        entries = []
+        for span in spans:
+            with span.lock:
+                counters = dict(span.counters)
+            entries.append({
+                "id": span.span_id,
+                "name": span.name,
+                "parent": span.parent_id,
+                "thread": span.thread,
+                "start_s": round(span.started - self.started, 4),
+                "duration_s": round((span.ended or now) - span.started, 4),
+                "open": span.ended is None,
+                "counters": {name: counters.get(name, 0) for name in COUNTERS},
+            })
+        return {"started": self.started_at.isoformat(), "duration_s": round(now - self.started, 4), "spans": entries}
+
+    def rows(self):
+        rows = []
+        for entry in self.to_dict()["spans"]:
+            row = {"Span": entry["name"], "Parent": entry["parent"] or "", "Id": entry["id"], "Start (s)": entry["start_s"], "Duration (s)": entry["duration_s"]}
+            row.update(entry["counters"])
+            rows.append(row)
+        return rows
+
+    def write(self, path, **extra):
+        trace = dict(extra, **self.to_dict())
+        with open(path, 'w', encoding='utf8') as trace_file:
+            json.dump(trace, trace_file, indent=1)
@@ -0,0 +1,153 @@
+# transport.py>
+
+import email.utils
+import random
+import threading
+import time
+import tracing
+
+
+THROTTLE_STATUSES = (429, 503, 504)
+
+
+class AdaptiveConcurrency:
+    # AIMD: one more slot after a full window of successes, half the slots after a throttle answer
+
+    def __init__(self, maximum, minimum=1, initial=None, cooldown=1.0):
+        self.maximum = max(1, maximum)
+        self.minimum = max(1, min(minimum, self.maximum))
+        self.limit = initial or max(self.minimum, self.maximum // 2)
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self.successes = 0
+        self.decreased_at = 0.0
+        self.condition = threading.Condition()
+
+    def __enter__(self):
+        with self.condition:
+            while self.in_flight >= self.limit:
+                self.condition.wait()
+            self.in_flight += 1
+        return self
+
+    def __exit__(self, *exc_info):
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify()
+
+    def increase(self):
+        with self.condition:
+            self.successes += 1
+            if self.successes >= self.limit and self.limit < self.maximum:
+                self.limit += 1
+                self.successes = 0
+                self.condition.notify()
+
+    def decrease(self):
+        with self.condition:
+            now = time.monotonic()
+            # requests that were already in flight answer 429 together, that is one signal and not many
+            if now - self.decreased_at < self.cooldown:
+                return
+            self.decreased_at = now
+            self.limit = max(self.minimum, self.limit // 2)
+            self.successes = 0
+
+
+class Transport:
+
+    def __init__(self, session, limiter, max_concurrency=8, attempts=5, backoff=1.0, max_backoff=60.0):
+        self.session = session
+        self.limiter = limiter
+        self.concurrency = AdaptiveConcurrency(max_concurrency)
+        self.attempts = max(1, attempts)
+        self.backoff_base = backoff
+        self.max_backoff = max_backoff
+        self.lock = threading.Lock()
+        self.counters = {"requests": 0, "throttled": 0, "retries": 0, "errors": 0, "waited": 0.0}
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] += value
+        if name in tracing.COUNTERS:
+            tracing.count(name, value)
+
+    def response_size(self, response):
+        length = response.headers.get('Content-Length')
+        if length is not None:
+            return int(length)
+        return len(response.content)
+
+    def retry_after(self, response):
+        value = response.headers.get('Retry-After') if response is not None else None
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        retry_date = email.utils.parsedate_to_datetime(value)
+        return max(0.0, retry_date.timestamp() - time.time())
+
+    def backoff(self, attempt, response=None):
+        delay = self.retry_after(response)
+        if delay is None:
+            # full jitter, so workers that were throttled together do not come back together
+            delay = random.uniform(0, min(self.max_backoff, self.backoff_base * 2 ** attempt))
+        self.concurrency.decrease()
+        self.limiter.pause(delay)
+        self.count("waited", delay)
+        return delay
+
+    def request(self, method, url, **kwargs):
+        import requests
+        send = getattr(self.session, method)
+        for attempt in range(self.attempts):
+            self.limiter.acquire()
+            try:
+                with self.concurrency:
+                    self.count("requests")
+                    tracing.count("http_calls")
+                    response = send(url, **kwargs)
+                tracing.count("bytes", self.response_size(response))
+            except (requests.ConnectionError, requests.Timeout):
+                self.count("errors")
+                if attempt + 1 == self.attempts:
+                    raise
+                self.count("retries")
+                self.backoff(attempt)
+                continue
+            if response.status_code in THROTTLE_STATUSES:
+                self.count("throttled")
+                response.close()
+                # a throttle answer read as data would leave the report silently missing events
+                if attempt + 1 == self.attempts:
+                    raise requests.HTTPError(f"{method.upper()} {url} was still throttled ({response.status_code}) after {self.attempts} attempts", response=response)
+                self.count("retries")
+                self.backoff(attempt, response)
+                continue
+            else:
+                self.concurrency.increase()
+            return response
+
+    def get(self, url, **kwargs):
+        return self.request("get", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("post", url, **kwargs)
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+        stats["concurrency"] = self.concurrency.limit
+        return stats
+
+
+def configure_session(session, pool_size):
+    from requests.adapters import HTTPAdapter
+    # every worker keeps its connection alive instead of reconnecting when the default pool of 10 is full
+    for adapter in session.adapters.values():
+        if isinstance(adapter, HTTPAdapter):
+            adapter.poolmanager.clear()
+            adapter.init_poolmanager(pool_size, pool_size)
+    return session
@@ -0,0 +1,102 @@
+import configparser
+import datetime
+import json
+import os
+import re
+import sys
+import types
+from unittest import mock
+
+import requests
+
+REPORTLY_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "reportly")
+sys.path.insert(0, REPORTLY_DIR)
+
+import graph as graph_module
+from graph import Graph
+
+USER = "user@contoso.com"
+
+
+def audit_event(event_id, created):
+    return {"id": event_id, "category": "UserManagement", "activityDisplayName": "Update user", "activityDateTime": created,
+            "result": "success", "targetResources": [], "initiatedBy": {"user": {"userPrincipalName": USER}}}
+
+
+def answer(status, body):
+    response = requests.Response()
+    response.status_code = status
+    response._content = json.dumps(body).encode()
+    return response
+
+
+class FakeTransport:
+    # answers the initiated audit query like Graph does, with the events inside the $filter's date range
+
+    def __init__(self, events, fail_target=False):
+        self.events = events
+        self.fail_target = fail_target
+
+    def get(self, url, headers=None):
+        if self.fail_target and "targetResources" in url:
+            return answer(502, {"error": {"code": "BadGateway", "message": "upstream failed"}})
+        if "initiatedBy" not in url:
+            return answer(200, {"value": []})
+        start = re.search(r"activityDateTime ge (\S+)", url).group(1)
+        end = re.search(r"activityDateTime lt (\S+)", url).group(1)
+        return answer(200, {"value": [event for event in self.events if start <= event["activityDateTime"] < end]})
+
+
+def create_graph(checkpoint_dir, transport):
+    config = configparser.ConfigParser()
+    config.read(os.path.join(REPORTLY_DIR, "config.cfg"))
+    settings = config["azure"]
+    settings["checkpointDir"] = str(checkpoint_dir)
+    settings["checkpointLag"] = "0"
+    settings["shardPages"] = "0"
+    settings["resumeFetches"] = "false"
+    return Graph(settings, USER, "2024-01-01", "2024-01-02", use_cache=True, client=object(), transport=transport)
+
+
+def fetch_events(graph):
+    graph.load_checkpoint()
+    graph.get_audit_initiated()
+    graph.get_audit_target()
+    graph.get_audit_signIn_success()
+    graph.get_audit_signIn_failed()
+
+
+def save_checkpoint_at(graph, now):
+    class FrozenDatetime(datetime.datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return now
+
+    frozen = types.SimpleNamespace(datetime=FrozenDatetime, timedelta=datetime.timedelta, timezone=datetime.timezone)
+    with mock.patch.object(graph_module, "datetime", frozen):
+        graph.save_checkpoint()
+
+
+def test_event_in_the_high_water_mark_second_is_kept_once(tmp_path):
+    transport = FakeTransport([audit_event("e0", "2024-01-01T09:00:00Z"), audit_event("e1", "2024-01-01T10:00:00Z")])
+    first = create_graph(tmp_path, transport)
+    fetch_events(first)
+    save_checkpoint_at(first, datetime.datetime(2024, 1, 1, 10, 0, 0, 500000, tzinfo=datetime.timezone.utc))
+
+    second = create_graph(tmp_path, transport)
+    fetch_events(second)
+    assert second.audit_initiated.column("id") == ["e0", "e1"]
+    assert second.fetch_start == datetime.datetime(2024, 1, 1, 10, 0, 0, tzinfo=datetime.timezone.utc)
+
+
+def test_checkpoint_is_not_saved_after_a_failed_query(tmp_path):
+    graph = create_graph(tmp_path, FakeTransport([audit_event("e1", "2024-01-01T10:00:00Z")], fail_target=True))
+    graph.get_audit_initiated()
+    try:
+        graph.get_audit_target()
+    except requests.HTTPError:
+        pass
+    graph.get_audit_signIn_success()
+    graph.get_audit_signIn_failed()
+    save_checkpoint_at(graph, datetime.datetime(2024, 1, 1, 12, 0, tzinfo=datetime.timezone.utc))
+    assert not os.path.exists(graph.checkpoint_path())